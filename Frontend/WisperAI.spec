@@ -3,7 +3,7 @@ from PyInstaller.utils.hooks import collect_all
 
 datas = [('assets', 'assets')]
 binaries = []
-hiddenimports = ['pyaudio', 'keyboard', 'groq', 'requests']
+hiddenimports = ['pyaudio', 'keyboard', 'groq', 'requests', 'soundfile']
 tmp_ret = collect_all('qfluentwidgets')
 datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
 tmp_ret = collect_all('whisper')
@@ -12,7 +12,7 @@ datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
 
 a = Analysis(
     ['main.py'],
-    pathex=[],
+    pathex=['..'],  # общие модули из корня проекта
     binaries=binaries,
     datas=datas,
     hiddenimports=hiddenimports,
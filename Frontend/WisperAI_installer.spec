@@ -11,7 +11,7 @@ binaries = [
     (os.path.join(ffmpeg_path, 'ffmpeg.exe'), '.'),
     (os.path.join(ffmpeg_path, 'ffprobe.exe'), '.'),
 ]
-hiddenimports = ['pyaudio', 'keyboard', 'groq', 'requests']
+hiddenimports = ['pyaudio', 'keyboard', 'groq', 'requests', 'soundfile']
 
 # Собираем все зависимости qfluentwidgets
 tmp_ret = collect_all('qfluentwidgets')
@@ -23,7 +23,7 @@ datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
 
 a = Analysis(
     ['main.py'],
-    pathex=[],
+    pathex=['..'],  # общие модули из корня проекта
     binaries=binaries,
     datas=datas,
     hiddenimports=hiddenimports,
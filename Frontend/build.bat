@@ -3,6 +3,7 @@ cd /d "%~dp0"
 echo Building WisperAI with Icon...
 ..\venv\Scripts\pyinstaller --noconsole --onefile --clean ^
     --name="WisperAI" ^
+    --paths=".." ^
     --icon="assets\asteroid.ico" ^
     --collect-all qfluentwidgets ^
     --collect-all whisper ^
@@ -10,6 +11,7 @@ echo Building WisperAI with Icon...
     --hidden-import=keyboard ^
     --hidden-import=groq ^
     --hidden-import=requests ^
+    --hidden-import=soundfile ^
     --exclude-module PyQt5 ^
     --exclude-module PyQt5.QtCore ^
     --exclude-module PyQt5.QtGui ^
@@ -6,8 +6,23 @@ from qfluentwidgets import FluentIcon as FIF
 import os
 import sys
 from workers import GlobalSpeechWorker
+from metrics import RollingStats
 from dotenv import load_dotenv
 
+# Подписи этапов в разбивке времени последней диктовки
+STAGE_LABELS = {
+    "queue": "очередь",
+    "reload": "загрузка модели",
+    "capture": "запись",
+    "resample": "ресемплинг",
+    "trim": "обрезка тишины",
+    "upload": "запрос к API",
+    "inference": "распознавание",
+    "finalize": "дораспознавание",
+    "gpt_correction": "YandexGPT",
+    "paste": "вставка",
+}
+
 def get_env_path():
     """Возвращает путь к .env файлу (AppData для exe, корень проекта для скрипта)"""
     if getattr(sys, 'frozen', False):
@@ -16,6 +31,18 @@ def get_env_path():
     else:
         return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
 
+# Порядок пунктов в списке режимов
+LOCAL_MODE_INDEX = 2
+
+def default_mode_index():
+    """Индекс режима по DEFAULT_MODE с учётом наличия ключей (облако без ключа -> локально)"""
+    default_mode = os.getenv("DEFAULT_MODE", "local").strip().lower()
+    if default_mode == "api" and os.getenv("GROQ_API_KEY"):
+        return 0
+    if default_mode == "yandex" and os.getenv("YANDEX_API_KEY"):
+        return 1
+    return LOCAL_MODE_INDEX
+
 class HomeInterface(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent=parent)
@@ -34,6 +61,9 @@ class HomeInterface(QWidget):
         
         self.worker = None
         self.thread = None
+        # Задержка после отпускания клавиши по последним диктовкам
+        self.latency_stats = RollingStats(window=100)
+        self.reload_seconds = 0.0  # загрузка выгруженной модели в текущей диктовке
         
         self.initUI()
         self.initWorker()
@@ -65,21 +95,7 @@ class HomeInterface(QWidget):
         self.modeComboBox.setFixedWidth(200)
         
         # Select default based on key availability and settings
-        default_mode = os.getenv("DEFAULT_MODE", "local").strip().lower()
-        api_key = os.getenv("GROQ_API_KEY")
-        yandex_key = os.getenv("YANDEX_API_KEY")
-        
-        has_groq = bool(api_key)
-        has_yandex = bool(yandex_key)
-        
-        # Determine index
-        target_index = 2 # Local default
-        if default_mode == "api" and has_groq:
-            target_index = 0
-        elif default_mode == "yandex" and has_yandex:
-            target_index = 1
-        
-        self.modeComboBox.setCurrentIndex(target_index)
+        self.modeComboBox.setCurrentIndex(default_mode_index())
         
         # Disable options if keys are missing (logic could be complex, simple check for now)
         # Ideally, we should use a model to disable specific items, but QComboBox simple API is limited.
@@ -100,6 +116,11 @@ class HomeInterface(QWidget):
         
         self.vBoxLayout.addWidget(self.controlCard)
 
+        # Timing of the last dictation
+        self.metricsLabel = BodyLabel("Время этапов появится после первой диктовки", self)
+        self.metricsLabel.setWordWrap(True)
+        self.vBoxLayout.addWidget(self.metricsLabel)
+
         # Log Area
         self.logLabel = BodyLabel("Журнал событий:", self)
         self.vBoxLayout.addWidget(self.logLabel)
@@ -126,7 +147,18 @@ class HomeInterface(QWidget):
             yandex_folder_id=folder_id,
             use_groq=use_groq, 
             use_yandex=use_yandex,
-            model_name=model_size
+            model_name=model_size,
+            streaming=os.getenv("STREAMING_MODE", "0") == "1",
+            yandex_sample_rate=int(os.getenv("YANDEX_SAMPLE_RATE", "16000")),
+            continuous_capture=os.getenv("CAPTURE_MODE", "on_demand") == "continuous",
+            preroll_ms=int(os.getenv("PREROLL_MS", "300")),
+            hands_free=os.getenv("DICTATION_MODE", "hold") == "hands_free",
+            vad_hang_ms=int(os.getenv("VAD_HANG_MS", "800")),
+            vad_sensitivity=float(os.getenv("VAD_SENSITIVITY", "3.0")),
+            hedge=os.getenv("HEDGE_MODE", "0") == "1",
+            hedge_delay_ms=int(os.getenv("HEDGE_DELAY_MS", "0")),
+            segment_seconds=float(os.getenv("DICTATION_SEGMENT_SECONDS", "20")),
+            paste_mode=os.getenv("PASTE_MODE", "clipboard")
         )
         self.thread = QThread()
         self.worker.moveToThread(self.thread)
@@ -136,6 +168,9 @@ class HomeInterface(QWidget):
         self.worker.status_changed.connect(self.update_status)
         self.worker.text_ready.connect(self.log_success)
         self.worker.error_occurred.connect(self.log_error)
+        self.worker.job_finished.connect(self.show_job_metrics)
+        self.worker.model_unloaded.connect(self.on_model_unloaded)
+        self.worker.model_reloaded.connect(self.on_model_reloaded)
         
     def toggle_service(self, checked):
         if checked:
@@ -150,6 +185,17 @@ class HomeInterface(QWidget):
             self.worker.yandex_key = os.getenv("YANDEX_API_KEY")
             self.worker.yandex_folder_id = os.getenv("YANDEX_FOLDER_ID")
             self.worker.model_name = os.getenv("MODEL_SIZE", "small")
+            self.worker.streaming = os.getenv("STREAMING_MODE", "0") == "1"
+            self.worker.yandex_sample_rate = int(os.getenv("YANDEX_SAMPLE_RATE", "16000"))
+            self.worker.continuous_capture = os.getenv("CAPTURE_MODE", "on_demand") == "continuous"
+            self.worker.preroll_ms = int(os.getenv("PREROLL_MS", "300"))
+            self.worker.hands_free = os.getenv("DICTATION_MODE", "hold") == "hands_free"
+            self.worker.vad_hang_ms = int(os.getenv("VAD_HANG_MS", "800"))
+            self.worker.vad_sensitivity = float(os.getenv("VAD_SENSITIVITY", "3.0"))
+            self.worker.hedge = os.getenv("HEDGE_MODE", "0") == "1"
+            self.worker.hedge_delay_ms = int(os.getenv("HEDGE_DELAY_MS", "0"))
+            self.worker.segment_seconds = float(os.getenv("DICTATION_SEGMENT_SECONDS", "20"))
+            self.worker.paste_mode = os.getenv("PASTE_MODE", "clipboard")
             
             self.modeComboBox.setEnabled(False)
             
@@ -181,13 +227,51 @@ class HomeInterface(QWidget):
         if status == "recording":
             self.statusLabel.setText("Запись...")
             self.iconWidget.setIcon(FIF.MICROPHONE)
+        elif status == "listening":
+            self.statusLabel.setText("Слушаю (F8 — остановить)...")
+            self.iconWidget.setIcon(FIF.MICROPHONE)
         elif status == "transcribing":
-            self.statusLabel.setText("Распознавание...")
+            if self.reload_seconds:
+                self.statusLabel.setText(f"Распознавание... (модель загружена за {self.reload_seconds:.1f} с)")
+            else:
+                self.statusLabel.setText("Распознавание...")
             self.iconWidget.setIcon(FIF.FOLDER)
         else:
+            self.reload_seconds = 0.0
             self.statusLabel.setText("Ожидание (F8)")
             self.iconWidget.setIcon(FIF.MICROPHONE)
 
+    def on_preload_progress(self, percent, text):
+        """Background model preload after startup; the service status takes priority."""
+        if percent >= 100:
+            self.log_message(f"{text}: {os.getenv('MODEL_SIZE', 'small')}")
+        if self.thread.isRunning():
+            return
+        if percent >= 100:
+            self.statusLabel.setText("Служба остановлена")
+        else:
+            self.statusLabel.setText(f"Служба остановлена · {text}")
+
+    def on_model_unloaded(self, description):
+        self.log_message(f"💤 Модель выгружена: {description}. Загрузится снова при нажатии F8")
+
+    def on_model_reloaded(self, seconds):
+        # Показывается в статусе до конца текущей диктовки
+        self.reload_seconds = seconds
+        self.log_message(f"Модель загружена заново за {seconds:.1f} с")
+
+    def show_job_metrics(self, job):
+        self.latency_stats.add(job["latency_ms"])
+        stages = " · ".join(f"{STAGE_LABELS.get(stage, stage)} {ms:.0f} мс"
+                            for stage, ms in job["stages"].items())
+        p50 = self.latency_stats.percentile(50)
+        p95 = self.latency_stats.percentile(95)
+        self.metricsLabel.setText(
+            f"Последняя диктовка: {stages}\n"
+            f"После отпускания: {job['latency_ms']:.0f} мс "
+            f"(p50 {p50:.0f} мс, p95 {p95:.0f} мс за {len(self.latency_stats.values)})"
+        )
+
     def log_message(self, msg):
         self.logText.append(msg)
 
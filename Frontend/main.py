@@ -1,11 +1,31 @@
+import time
+STARTUP_STARTED = time.perf_counter()
+
 import sys
 import os
 import ctypes
+import multiprocessing
 from dotenv import load_dotenv
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QThread
 from PyQt6.QtWidgets import QApplication, QSplashScreen, QLabel, QVBoxLayout, QWidget
 from PyQt6.QtGui import QIcon, QFont, QPixmap, QPainter, QColor, QBrush, QPen
 
+# Отметки времени запуска: (этап, момент) — печатаются, когда окно показано
+startup_marks = []
+
+def mark_startup(stage):
+    startup_marks.append((stage, time.perf_counter()))
+
+def report_startup():
+    previous = STARTUP_STARTED
+    parts = []
+    for stage, at in startup_marks:
+        parts.append(f"{stage} {(at - previous) * 1000:.0f} ms")
+        previous = at
+    print(f"Startup: {', '.join(parts)} — window shown after {(previous - STARTUP_STARTED) * 1000:.0f} ms")
+
+mark_startup("qt")
+
 # 1. Load configuration BEFORE importing interfaces
 if getattr(sys, 'frozen', False):
     # Running as compiled exe — используем AppData для .env (Program Files защищён от записи)
@@ -29,6 +49,7 @@ else:
     env_path = os.path.join(root_dir, ".env")
 
 load_dotenv(env_path, override=True)
+mark_startup("env")
 
 # 2. Fix Taskbar Icon
 myappid = 'wisper.gui.app.v1' # Arbitrary string
@@ -38,9 +59,51 @@ except ImportError:
     pass
 
 from qfluentwidgets import (NavigationItemPosition, FluentWindow, FluentIcon as FIF)
-from home_interface import HomeInterface
-from transcribe_interface import TranscribeInterface
-from settings_interface import SettingsInterface
+from home_interface import HomeInterface, LOCAL_MODE_INDEX, default_mode_index
+from workers import ModelPreloadWorker
+from calibration import recommended_model
+# Вкладки транскрипции и настроек импортируются и строятся при первом открытии
+mark_startup("imports")
+
+# AUTO_MODEL=1: модель и движок берутся из сохранённой калибровки, замеров при запуске нет
+if os.getenv("AUTO_MODEL", "0") == "1":
+    recommended = recommended_model()
+    if recommended:
+        os.environ["MODEL_SIZE"], os.environ["LOCAL_ENGINE"] = recommended
+        print(f"Auto model: {recommended[0]} ({recommended[1]}) from calibration")
+    else:
+        # Нет замеров или они сделаны на синтетике — задержка занижена, выбирать по ним нельзя
+        print("Auto model: no calibration on speech recordings, using MODEL_SIZE")
+
+
+class LazyInterface(QWidget):
+    """Placeholder tab that builds the real interface on first navigation."""
+
+    def __init__(self, factory, object_name, parent=None):
+        super().__init__(parent=parent)
+        self.setObjectName(object_name)
+        self.factory = factory
+        self.interface = None
+        self.vBoxLayout = QVBoxLayout(self)
+        self.vBoxLayout.setContentsMargins(0, 0, 0, 0)
+
+    def showEvent(self, event):
+        if self.interface is None:
+            started = time.perf_counter()
+            self.interface = self.factory(self)
+            self.vBoxLayout.addWidget(self.interface)
+            print(f"{self.objectName()} built in {(time.perf_counter() - started) * 1000:.0f} ms")
+        super().showEvent(event)
+
+
+def create_transcribe_interface(parent):
+    from transcribe_interface import TranscribeInterface
+    return TranscribeInterface(parent)
+
+
+def create_settings_interface(parent):
+    from settings_interface import SettingsInterface
+    return SettingsInterface(parent)
 
 
 class SplashScreen(QWidget):
@@ -60,6 +123,7 @@ class SplashScreen(QWidget):
         )
         
         self.status_text = "Загрузка..."
+        self.progress = None  # 0-100 во время загрузки модели
         
     def paintEvent(self, event):
         painter = QPainter(self)
@@ -82,6 +146,15 @@ class SplashScreen(QWidget):
         painter.setPen(QColor(100, 180, 255))
         painter.drawText(self.rect().adjusted(0, 100, 0, 0), Qt.AlignmentFlag.AlignHCenter, "🎤")
         
+        # Полоса загрузки модели
+        if self.progress is not None:
+            bar_width = self.width() - 80
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QBrush(QColor(60, 60, 60)))
+            painter.drawRoundedRect(40, self.height() - 22, bar_width, 4, 2, 2)
+            painter.setBrush(QBrush(QColor(100, 180, 255)))
+            painter.drawRoundedRect(40, self.height() - 22, bar_width * self.progress // 100, 4, 2, 2)
+        
         # Статус загрузки
         font_status = QFont("Segoe UI", 11)
         painter.setFont(font_status)
@@ -93,6 +166,10 @@ class SplashScreen(QWidget):
     def set_status(self, text):
         self.status_text = text
         self.repaint()
+    
+    def set_progress(self, percent, text):
+        self.progress = percent
+        self.set_status(text)
 
 
 class Window(FluentWindow):
@@ -112,8 +189,8 @@ class Window(FluentWindow):
 
         # create sub interfaces
         self.homeInterface = HomeInterface(self)
-        self.transcribeInterface = TranscribeInterface(self)
-        self.settingInterface = SettingsInterface(self)
+        self.transcribeInterface = LazyInterface(create_transcribe_interface, "TranscribeInterface", self)
+        self.settingInterface = LazyInterface(create_settings_interface, "SettingsInterface", self)
 
         # initialize layout
         self.initNavigation()
@@ -130,11 +207,15 @@ class Window(FluentWindow):
         self.setWindowTitle('Wisper AI')
 
 if __name__ == '__main__':
+    # Нужно для пула процессов пакетной транскрипции в собранном exe
+    multiprocessing.freeze_support()
+    
     # Fix High DPI scaling
     QApplication.setHighDpiScaleFactorRoundingPolicy(
         Qt.HighDpiScaleFactorRoundingPolicy.PassThrough)
     
     app = QApplication(sys.argv)
+    mark_startup("app")
     
     # Set default font to prevent setPointSize warnings
     font = QFont("Segoe UI", 10)
@@ -145,16 +226,35 @@ if __name__ == '__main__':
     splash.show()
     app.processEvents()
     
+    # В локальном режиме модель грузится и прогревается в фоне; окно её не ждёт:
+    # первое нажатие F8 дождётся загрузки на замке реестра
+    preload_thread = None
+    if default_mode_index() == LOCAL_MODE_INDEX:
+        preloader = ModelPreloadWorker(os.getenv("MODEL_SIZE", "small"))
+        preload_thread = QThread()
+        preloader.moveToThread(preload_thread)
+        preload_thread.started.connect(preloader.run)
+        preloader.error.connect(print)
+        preloader.finished.connect(preload_thread.quit)
+        preload_thread.start()
+    
+    def on_model_ready():
+        print(f"Startup: model ready after {(time.perf_counter() - STARTUP_STARTED) * 1000:.0f} ms")
+    
     # Обновляем статус и загружаем главное окно
     splash.set_status("Инициализация интерфейса...")
     app.processEvents()
     
     w = Window()
-    
-    splash.set_status("Готово!")
-    app.processEvents()
-    
-    # Закрываем splash и показываем главное окно
-    QTimer.singleShot(300, lambda: (splash.close(), w.show()))
+    mark_startup("window")
+    if preload_thread:
+        # Ход загрузки модели показывается на главной вкладке
+        preloader.progress.connect(w.homeInterface.on_preload_progress)
+        preloader.error.connect(w.homeInterface.log_error)
+        preload_thread.finished.connect(on_model_ready)
+    splash.close()
+    w.show()
+    mark_startup("shown")
+    report_startup()
     
     sys.exit(app.exec())
@@ -1,11 +1,13 @@
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QThread
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout
-from qfluentwidgets import (SubtitleLabel, BodyLabel, LineEdit, ComboBox, 
-                            PrimaryPushButton, CardWidget, InfoBar, InfoBarPosition)
+from qfluentwidgets import (SubtitleLabel, BodyLabel, LineEdit, ComboBox, CheckBox, PushButton,
+                            PrimaryPushButton, CardWidget, ProgressBar, InfoBar, InfoBarPosition)
 from qfluentwidgets import FluentIcon as FIF
 import os
 import sys
 from dotenv import set_key
+from workers import CalibrationWorker
+from calibration import MODELS, Calibration, downloaded_models, latency_budget_ms
 
 def get_env_path():
     """Возвращает путь к .env файлу (AppData для exe, корень проекта для скрипта)"""
@@ -23,6 +25,8 @@ class SettingsInterface(QWidget):
         super().__init__(parent=parent)
         self.setObjectName("SettingsInterface")
         self.env_path = get_env_path()
+        self.calibration = Calibration()
+        self.calibration_thread = None
         
         self.initUI()
         self.load_settings()
@@ -78,20 +82,36 @@ class SettingsInterface(QWidget):
         self.modelLabel = BodyLabel("Локальная модель Whisper", self.modelCard)
         self.modelComboBox = ComboBox(self.modelCard)
         
-        # Populate models with download status
-        downloaded = self.get_downloaded_models()
-        models = ["tiny", "base", "small", "medium", "large", "turbo"]
-        
-        for m in models:
-            text = m
-            if m in downloaded:
-                text += " (Скачано)"
-            # Important: use userData parameter for clean value
-            self.modelComboBox.addItem(text, userData=m)
+        # Populate models with download status and measured latency
+        self.populate_models()
         
         self.modelLayout.addWidget(self.modelLabel)
         self.modelLayout.addWidget(self.modelComboBox)
         
+        # Те же модели можно запускать через CTranslate2 с int8 — в разы быстрее на CPU
+        self.engineLabel = BodyLabel("Движок локальной модели", self.modelCard)
+        self.engineComboBox = ComboBox(self.modelCard)
+        self.engineComboBox.addItem("PyTorch (openai-whisper)", userData="pytorch")
+        self.engineComboBox.addItem("CTranslate2 int8 (faster-whisper)", userData="ctranslate2")
+        
+        self.modelLayout.addWidget(self.engineLabel)
+        self.modelLayout.addWidget(self.engineComboBox)
+        
+        # Калибровка: замер моделей на этом компьютере и выбор по бюджету задержки
+        self.calibrationLabel = BodyLabel(self.modelCard)
+        self.calibrationLabel.setWordWrap(True)
+        self.calibrationProgress = ProgressBar(self.modelCard)
+        self.calibrationProgress.hide()
+        self.calibrateBtn = PushButton(FIF.SPEED_HIGH, "Подобрать модель", self.modelCard)
+        self.calibrateBtn.clicked.connect(self.start_calibration)
+        self.autoModelCheckBox = CheckBox("Выбирать модель по калибровке при запуске", self.modelCard)
+        
+        self.modelLayout.addWidget(self.calibrationLabel)
+        self.modelLayout.addWidget(self.calibrationProgress)
+        self.modelLayout.addWidget(self.calibrateBtn, 0, Qt.AlignmentFlag.AlignLeft)
+        self.modelLayout.addWidget(self.autoModelCheckBox)
+        self.update_calibration_label()
+        
         self.vBoxLayout.addWidget(self.modelCard)
 
         # Default Mode Card
@@ -118,22 +138,122 @@ class SettingsInterface(QWidget):
 
     def get_downloaded_models(self):
         """Checks standard Whisper cache for existing models."""
-        downloaded = []
-        try:
-            home = os.path.expanduser("~")
-            cache_dir = os.path.join(home, ".cache", "whisper")
-            
-            if os.path.exists(cache_dir):
-                files = os.listdir(cache_dir)
-                for f in files:
-                    if f.endswith(".pt"):
-                        for m in ["tiny", "base", "small", "medium", "large", "turbo"]:
-                            # Matches filenames like 'small.pt' or hashes starting with 'small'
-                            if f.startswith(m):
-                                downloaded.append(m)
-        except Exception:
-            pass
-        return list(set(downloaded))
+        return downloaded_models()
+
+    def populate_models(self):
+        current = self.modelComboBox.itemData(self.modelComboBox.currentIndex())
+        self.modelComboBox.clear()
+        downloaded = self.get_downloaded_models()
+        for m in MODELS:
+            notes = []
+            if m in downloaded:
+                notes.append("Скачано")
+            measured = [r["latency_ms"] for r in self.calibration.results.values() if r["model"] == m]
+            if measured:
+                notes.append(f"~{min(measured) / 1000:.1f} с")
+            text = f"{m} ({', '.join(notes)})" if notes else m
+            # Important: use userData parameter for clean value
+            self.modelComboBox.addItem(text, userData=m)
+        if current:
+            self.select_item(self.modelComboBox, current)
+
+    def select_item(self, combo, value):
+        for i in range(combo.count()):
+            if combo.itemData(i) == value:
+                combo.setCurrentIndex(i)
+                return True
+        return False
+
+    def update_calibration_label(self):
+        budget = latency_budget_ms()
+        best, fits = self.calibration.recommend(budget)
+        if self.calibration.synthetic and self.calibration.results:
+            text = ("Замер сделан на синтетических фразах: на реальной речи задержка больше, поэтому "
+                    "модель не подбирается автоматически. Положите записи своей речи (3–10 секунд) "
+                    "в папку calibration_clips или CALIBRATION_CLIPS_DIR и повторите калибровку.")
+        elif best is None:
+            text = (f"Калибровка не проводилась. Она замерит скачанные модели на этом компьютере "
+                    f"и подберёт самую точную, которая распознаёт фразу быстрее {budget} мс.")
+        elif fits:
+            text = (f"Рекомендуется: {best['model']} ({best['engine']}) — {best['latency_ms']} мс "
+                    f"на фразу, RTF {best['rtf']}, до {best['peak_rss_mb']} МБ памяти (бюджет {budget} мс).")
+        else:
+            text = (f"Ни одна модель не укладывается в {budget} мс; самая быстрая — "
+                    f"{best['model']} ({best['engine']}), {best['latency_ms']} мс.")
+        self.calibrationLabel.setText(text)
+        return best
+
+    def start_calibration(self):
+        self.calibrateBtn.setEnabled(False)
+        self.calibrationProgress.setValue(0)
+        self.calibrationProgress.show()
+        
+        self.calibration_worker = CalibrationWorker()
+        self.calibration_thread = QThread()
+        self.calibration_worker.moveToThread(self.calibration_thread)
+        
+        self.calibration_thread.started.connect(self.calibration_worker.run)
+        self.calibration_worker.progress.connect(self.on_calibration_progress)
+        self.calibration_worker.finished.connect(self.on_calibration_finished)
+        self.calibration_worker.error.connect(self.on_calibration_error)
+        
+        self.calibration_thread.start()
+
+    def on_calibration_progress(self, percent, text):
+        self.calibrationProgress.setValue(percent)
+        self.calibrationLabel.setText(text)
+
+    def stop_calibration(self):
+        self.calibrateBtn.setEnabled(True)
+        self.calibrationProgress.hide()
+        if self.calibration_thread:
+            self.calibration_thread.quit()
+            self.calibration_thread.wait()
+
+    def on_calibration_finished(self, table):
+        print(table)
+        self.stop_calibration()
+        self.calibration = Calibration()
+        self.populate_models()
+        best = self.update_calibration_label()
+        if best is None:
+            synthetic = self.calibration.synthetic and self.calibration.results
+            InfoBar.warning(
+                title='Калибровка',
+                content=("Замер на синтетике: модель не выбрана" if synthetic
+                         else "Нет скачанных моделей для замера"),
+                orient=Qt.Orientation.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP_RIGHT,
+                duration=3000,
+                parent=self
+            )
+            return
+        # Рекомендация выбирается в списках, сохраняется кнопкой «Сохранить»
+        self.select_item(self.modelComboBox, best["model"])
+        self.select_item(self.engineComboBox, best["engine"])
+        InfoBar.success(
+            title='Калибровка',
+            content=f"Выбрана модель {best['model']} ({best['engine']})",
+            orient=Qt.Orientation.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.TOP_RIGHT,
+            duration=3000,
+            parent=self
+        )
+
+    def on_calibration_error(self, err):
+        self.stop_calibration()
+        self.update_calibration_label()
+        InfoBar.error(
+            title='Ошибка',
+            content=str(err),
+            orient=Qt.Orientation.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.TOP_RIGHT,
+            duration=3000,
+            parent=self
+        )
 
     def load_settings(self):
         api_key = os.getenv("GROQ_API_KEY", "")
@@ -155,6 +275,15 @@ class SettingsInterface(QWidget):
         if idx != -1:
             self.modelComboBox.setCurrentIndex(idx)
         
+        # Load Local Engine
+        engine = os.getenv("LOCAL_ENGINE", "pytorch")
+        for i in range(self.engineComboBox.count()):
+            if self.engineComboBox.itemData(i) == engine:
+                self.engineComboBox.setCurrentIndex(i)
+                break
+        
+        self.autoModelCheckBox.setChecked(os.getenv("AUTO_MODEL", "0") == "1")
+        
         # Load Default Mode
         default_mode = os.getenv("DEFAULT_MODE", "local")
         idx = -1
@@ -174,6 +303,8 @@ class SettingsInterface(QWidget):
             # Get data from itemData instead of text
             new_model = self.modelComboBox.itemData(self.modelComboBox.currentIndex())
             new_mode = self.modeComboBox.itemData(self.modeComboBox.currentIndex())
+            new_engine = self.engineComboBox.itemData(self.engineComboBox.currentIndex()) or "pytorch"
+            auto_model = "1" if self.autoModelCheckBox.isChecked() else "0"
             
             if not new_model: new_model = "small"
             if not new_mode: new_mode = "local"
@@ -188,6 +319,8 @@ class SettingsInterface(QWidget):
             set_key(self.env_path, "YANDEX_FOLDER_ID", new_folder_id)
             set_key(self.env_path, "MODEL_SIZE", str(new_model))
             set_key(self.env_path, "DEFAULT_MODE", str(new_mode))
+            set_key(self.env_path, "LOCAL_ENGINE", str(new_engine))
+            set_key(self.env_path, "AUTO_MODEL", auto_model)
             
             # Update session
             os.environ["GROQ_API_KEY"] = new_key
@@ -195,6 +328,8 @@ class SettingsInterface(QWidget):
             os.environ["YANDEX_FOLDER_ID"] = new_folder_id
             os.environ["MODEL_SIZE"] = str(new_model)
             os.environ["DEFAULT_MODE"] = str(new_mode)
+            os.environ["LOCAL_ENGINE"] = str(new_engine)
+            os.environ["AUTO_MODEL"] = auto_model
             
             InfoBar.success(
                 title='Сохранено',
@@ -1,10 +1,10 @@
 from PyQt6.QtCore import Qt, QThread
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QFileDialog
-from qfluentwidgets import (PrimaryPushButton, SubtitleLabel, BodyLabel, 
+from qfluentwidgets import (PrimaryPushButton, SubtitleLabel, BodyLabel, CheckBox,
                             TextEdit, ProgressBar, CardWidget, InfoBar, InfoBarPosition)
 from qfluentwidgets import FluentIcon as FIF
 import os
-from workers import TranscribeWorker
+from workers import TranscribeWorker, BatchTranscribeWorker
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -29,10 +29,13 @@ class TranscribeInterface(QWidget):
 
         # Controls
         self.controlLayout = QHBoxLayout()
-        self.fileBtn = PrimaryPushButton(FIF.FOLDER, "Выбрать аудиофайл", self)
+        self.fileBtn = PrimaryPushButton(FIF.FOLDER, "Выбрать аудиофайлы", self)
         self.fileBtn.clicked.connect(self.select_file)
         self.controlLayout.addWidget(self.fileBtn)
         self.controlLayout.addStretch(1)
+        # Готовые расшифровки берутся из кэша по содержимому файла; галочка заставляет распознать заново
+        self.noCacheCheckBox = CheckBox("Распознать заново (без кэша)", self)
+        self.controlLayout.addWidget(self.noCacheCheckBox)
         self.vBoxLayout.addLayout(self.controlLayout)
         
         # Progress Bar (Hidden by default)
@@ -50,12 +53,14 @@ class TranscribeInterface(QWidget):
         self.vBoxLayout.addWidget(self.resultText)
         
     def select_file(self):
-        file_path, _ = QFileDialog.getOpenFileName(
-            self, "Выберите аудиофайл", "", "Audio Files (*.mp3 *.wav *.m4a *.flac);;All Files (*.*)"
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self, "Выберите аудиофайлы", "", "Audio Files (*.mp3 *.wav *.m4a *.flac);;All Files (*.*)"
         )
         
-        if file_path:
-            self.start_transcription(file_path)
+        if len(file_paths) == 1:
+            self.start_transcription(file_paths[0])
+        elif file_paths:
+            self.start_batch(file_paths)
 
     def start_transcription(self, file_path):
         self.fileBtn.setEnabled(False)
@@ -66,16 +71,73 @@ class TranscribeInterface(QWidget):
         use_groq = bool(api_key)
         model_size = os.getenv("MODEL_SIZE", "small")
         
-        self.worker = TranscribeWorker(file_path, api_key=api_key, use_groq=use_groq, model_name=model_size)
+        self.worker = TranscribeWorker(file_path, api_key=api_key, use_groq=use_groq, model_name=model_size,
+                                       use_cache=not self.noCacheCheckBox.isChecked())
         self.thread = QThread()
         self.worker.moveToThread(self.thread)
         
         self.thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.on_progress)
         self.worker.finished.connect(self.on_success)
         self.worker.error.connect(self.on_error)
         
         self.thread.start()
 
+    def on_progress(self, percent, eta):
+        # Пока идёт загрузка аудио и модели, полоса остаётся неопределённой
+        self.progressBar.setRange(0, 100)
+        self.progressBar.setValue(percent)
+        if percent < 100:
+            self.resultLabel.setText(f"Результат: {percent}%, осталось ~{int(eta)} сек")
+        else:
+            self.resultLabel.setText("Результат:")
+
+    def start_batch(self, file_paths):
+        """Пакетный режим: файлы распределяются по пулу процессов, .txt пишутся рядом с аудио."""
+        self.fileBtn.setEnabled(False)
+        self.progressBar.setRange(0, 100)
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+        self.resultText.clear()
+        self.resultText.append(f"Пакетная транскрипция: {len(file_paths)} файлов...")
+        
+        api_key = os.getenv("GROQ_API_KEY")
+        workers = os.getenv("BATCH_WORKERS")
+        
+        self.worker = BatchTranscribeWorker(
+            file_paths,
+            use_groq=bool(api_key),
+            model_name=os.getenv("MODEL_SIZE", "small"),
+            workers=int(workers) if workers else None,
+            use_cache=not self.noCacheCheckBox.isChecked()
+        )
+        self.thread = QThread()
+        self.worker.moveToThread(self.thread)
+        
+        self.thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.progressBar.setValue)
+        self.worker.file_done.connect(self.on_file_done)
+        self.worker.finished.connect(self.on_batch_success)
+        self.worker.error.connect(self.on_error)
+        
+        self.thread.start()
+
+    def on_file_done(self, path, text):
+        self.resultText.append(f"\n=== {os.path.basename(path)} ===\n{text}")
+
+    def on_batch_success(self, summary):
+        self.resultText.append(f"\nГотово: {summary}")
+        self.stop_thread()
+        InfoBar.success(
+            title='Готово',
+            content=summary,
+            orient=Qt.Orientation.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.TOP_RIGHT,
+            duration=5000,
+            parent=self
+        )
+
     def on_success(self, text):
         self.resultText.setText(text)
         self.stop_thread()
@@ -104,7 +166,9 @@ class TranscribeInterface(QWidget):
 
     def stop_thread(self):
         self.fileBtn.setEnabled(True)
+        self.resultLabel.setText("Результат:")
         self.progressBar.hide()
+        self.progressBar.setRange(0, 0) # Back to indeterminate
         if self.thread:
             self.thread.quit()
             self.thread.wait()
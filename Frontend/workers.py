@@ -1,16 +1,12 @@
 import time
 import os
-import tempfile
 import threading
-import wave
 import keyboard
 import pyaudio
-import pyperclip
 import gc
-import requests
+import queue
 import subprocess
 import sys
-from groq import Groq
 from PyQt6.QtCore import QObject, pyqtSignal, QThread
 
 # Патч для скрытия консольного окна ffmpeg на Windows
@@ -25,16 +21,52 @@ if sys.platform == "win32":
     
     subprocess.Popen = _popen_no_console
 
-# Импортируем whisper ПОСЛЕ патча subprocess
-import whisper
+# Тяжёлые бэкенды (whisper/torch, groq, requests) импортируются только при выборе
+# режима, которому они нужны, — поэтому патч выше стоит до любого из этих импортов
+
+# Общие модули (streaming, audio_utils) лежат в корне проекта
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from audio_utils import (WHISPER_SAMPLE_RATE, negotiate_capture_rate, pcm16_to_whisper,
+                         resample_pcm16)
+from capture import ContinuousCapture, iter_chunks
+from cloud_backends import (GROQ_MODEL, CloudError, groq_transcribe_file, groq_transcribe_pcm,
+                            yandex_transcribe_file, yandex_transcribe_pcm)
+from correction import get_corrector
+from hedging import HedgeStats, hedged_call
+from metrics import JobTimer, format_stages, record_job
+from model_registry import model_tag, preload_model, start_idle_unloader
+from streaming import StreamingTranscriber
+from text_delivery import make_sink
+from transcript_cache import cached_transcribe
+from vad import Endpointer, format_trim_stats, trim_pcm16
+
+INITIAL_PROMPT = "Привет, это проба пера. Пишем текст на русском языке."
+# Предел записи без нарезки на сегменты (потоковый режим и прочие вызовы record_audio)
+MAX_RECORD_SECONDS = 600
+# Длинная диктовка режется на сегменты по паузе не короче SEGMENT_PAUSE_MS, как только
+# сегмент набрал segment_seconds; сегменты распознаются, пока запись продолжается
+SEGMENT_PAUSE_MS = 400
+# Сколько речи нужно сегменту: как у trim_silence, чтобы короткие «да» и «нет» не терялись
+SEGMENT_MIN_SPEECH_MS = 90
+# Сегментов в очереди на распознавание; при отставании запись ждёт, память не растёт
+MAX_PENDING_SEGMENTS = 4
 
 class GlobalSpeechWorker(QObject):
-    status_changed = pyqtSignal(str)  # "idle", "recording", "transcribing"
+    status_changed = pyqtSignal(str)  # "idle", "recording", "listening", "transcribing"
     text_ready = pyqtSignal(str)
     error_occurred = pyqtSignal(str)
+    job_finished = pyqtSignal(dict)  # время по этапам завершённой диктовки
+    model_unloaded = pyqtSignal(str)  # модель выгружена по простою или нехватке памяти
+    model_reloaded = pyqtSignal(float)  # модель загружена заново, секунды
     
     def __init__(self, api_key=None, model_name="small", hotkey="F8", 
-                 use_groq=False, use_yandex=False, yandex_key=None, yandex_folder_id=None):
+                 use_groq=False, use_yandex=False, yandex_key=None, yandex_folder_id=None,
+                 streaming=False, yandex_sample_rate=16000, continuous_capture=False,
+                 preroll_ms=300, hands_free=False, vad_hang_ms=800, vad_sensitivity=3.0,
+                 hedge=False, hedge_delay_ms=0, segment_seconds=20, paste_mode="clipboard"):
         super().__init__()
         self.api_key = api_key
         self.yandex_key = yandex_key
@@ -43,248 +75,551 @@ class GlobalSpeechWorker(QObject):
         self.hotkey = hotkey
         self.use_groq = use_groq
         self.use_yandex = use_yandex
+        self.streaming = streaming  # Распознавание окнами прямо во время записи (только Whisper)
+        self.yandex_sample_rate = yandex_sample_rate  # lpcm: 8000, 16000 или 48000
+        self.capture_rate = WHISPER_SAMPLE_RATE
+        # Постоянно открытый поток с кольцевым буфером и предзаписью
+        self.continuous_capture = continuous_capture
+        self.preroll_ms = preroll_ms
+        self.capture = None
+        # Режим без удержания: клавиша включает/выключает прослушивание,
+        # фразы выделяются по паузам (VAD) и распознаются, пока идёт запись следующей
+        self.hands_free = hands_free
+        self.vad_hang_ms = vad_hang_ms
+        self.vad_sensitivity = vad_sensitivity
+        self._last_capture_stats = {}
+        # Гонка облака с локальной моделью: вставляется первый непустой результат,
+        # локальное распознавание стартует через hedge_delay_ms (0 — сразу)
+        self.hedge = hedge
+        self.hedge_delay_ms = hedge_delay_ms
+        self.hedge_stats = HedgeStats()
+        self.segment_seconds = segment_seconds
+        # Доставка текста: буфер обмена с восстановлением, ввод символами или заглушка
+        self.paste_mode = paste_mode
+        self.sink = None
         self.running = False
         self.groq_client = None
         self.model = None
         self.p = None
+        # Нажатие и отпускание клавиши приходят событиями из хука keyboard
+        self.pressed = threading.Event()
+        self.released = threading.Event()
+        self.recording = False
+        self._key_down = False
+        self._hooks = []
         
     def initialize(self):
         """Loads the model or API client. Runs in the background thread."""
         try:
+            if self.sink is None or self.sink.mode != self.paste_mode:
+                self.sink = make_sink(self.paste_mode)
             self.p = pyaudio.PyAudio()
+            self.capture_rate = negotiate_capture_rate(self.p, self.target_rate(), pyaudio.paInt16)
+            print(f"Capture rate: {self.capture_rate} Hz (backend needs {self.target_rate()} Hz)")
+            if self.continuous_capture:
+                self.capture = ContinuousCapture(self.p, self.capture_rate,
+                                                 preroll_seconds=self.preroll_ms / 1000)
+                self.capture.start()
+                print(f"Continuous capture started (pre-roll {self.preroll_ms} ms)")
             
             if self.use_groq and self.api_key:
+                from groq import Groq
                 self.groq_client = Groq(api_key=self.api_key)
                 print("Groq Client Initialized")
             elif self.use_yandex and self.yandex_key:
                 print(f"Yandex SpeechKit Initialized (Folder: {self.yandex_folder_id})")
             else:
-                print(f"Loading Whisper model: {self.model_name}")
-                self.model = whisper.load_model(self.model_name)
+                # Если модель уже прогрета заставкой, это мгновенно
+                self.model = preload_model(self.model_name)
                 print("Whisper Model Loaded")
+
+            if self.hedge and self.model is None and self.cloud_ready():
+                # Для гонки с облаком нужна и локальная модель
+                self.model = preload_model(self.model_name)
+                print(f"Hedging enabled: cloud vs Whisper {self.model_name}, "
+                      f"local starts after {self.hedge_delay_ms} ms")
+
+            if self.model is not None:
+                # Простаивающая модель выгружается и загружается заново при следующем F8
+                start_idle_unloader(on_unload=self.on_model_unloaded)
                 
         except Exception as e:
             self.error_occurred.emit(f"Initialization Error: {e}")
 
+    def target_rate(self):
+        """Sample rate the selected backend consumes."""
+        if self.use_yandex:
+            return self.yandex_sample_rate
+        return WHISPER_SAMPLE_RATE
+
+    def backend_name(self):
+        if self.use_groq:
+            return "groq"
+        if self.use_yandex:
+            return "yandex"
+        return f"whisper-{model_tag(self.model_name)}"
+
+    def finish_job(self, timer, **extra):
+        """Emits the job's stage breakdown and appends it to the metrics file."""
+        job = timer.finish(paste_mode=self.sink.mode, **extra)
+        print(f"Timing: {format_stages(job)} (latency {job['latency_ms']:.0f} ms)")
+        record_job(job)
+        self.job_finished.emit(job)
+
+    def on_hotkey_press(self, event):
+        # Автоповтор клавиши присылает нажатия, пока она удерживается, — их пропускаем
+        if self._key_down:
+            return
+        self._key_down = True
+        if self.recording:
+            # В режиме без удержания повторное нажатие завершает прослушивание
+            if self.hands_free:
+                self.released.set()
+            return
+        self.recording = True
+        self.released.clear()
+        self.pressed.set()
+        if self.model is not None and not self.model.loaded:
+            # Выгруженная модель грузится, пока пользователь говорит
+            threading.Thread(target=self.ensure_model, daemon=True).start()
+
+    def on_model_unloaded(self, names, reason):
+        why = "нехватка памяти" if reason == "memory" else "простой"
+        self.model_unloaded.emit(f"{', '.join(names)} ({why})")
+
+    def ensure_model(self, timer=None):
+        """
+        Reloads the model if it was unloaded while idle. The wait goes to
+        `timer` as the "reload" stage; the load time is emitted for the status.
+        """
+        if self.model is None or self.model.loaded:
+            return
+        started = time.perf_counter()
+        try:
+            seconds = self.model.ensure_loaded()
+        except Exception as e:
+            self.error_occurred.emit(f"Model reload error: {e}")
+            return
+        if timer:
+            timer.add("reload", time.perf_counter() - started)
+        if seconds:
+            self.model_reloaded.emit(seconds)
+
+    def on_hotkey_release(self, event):
+        self._key_down = False
+        if not self.hands_free:
+            self.released.set()
+
     def run(self):
         self.running = True
+        self.pressed.clear()
+        self.recording = False
         self.initialize()
         
-        # Hotkey listener loop
+        self._hooks = [
+            keyboard.on_press_key(self.hotkey, self.on_hotkey_press),
+            keyboard.on_release_key(self.hotkey, self.on_hotkey_release),
+        ]
         print(f"Worker started. Waiting for {self.hotkey}...")
         
+        # Поток спит, пока не придёт нажатие (или stop())
         while self.running:
+            self.pressed.wait()
+            self.pressed.clear()
+            if not self.running:
+                break
             try:
-                if keyboard.is_pressed(self.hotkey):
+                if self.hands_free:
+                    self.perform_hands_free_session()
+                else:
                     self.perform_recording_cycle()
-                
-                time.sleep(0.05) # Prevent high CPU usage
             except Exception as e:
                 self.error_occurred.emit(str(e))
-                time.sleep(1)
+            finally:
+                self.recording = False
 
+        for hook in self._hooks:
+            try:
+                keyboard.unhook(hook)
+            except (KeyError, ValueError):
+                pass
+        self._hooks = []
+
+        if self.capture:
+            self.capture.close()
+            self.capture = None
         if self.p:
             self.p.terminate()
+        if self.sink and self.sink.latency.values:
+            print(f"Text delivery: {self.sink.summary()}")
 
     def perform_recording_cycle(self):
         self.status_changed.emit("recording")
-        
-        temp_filename = ""
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-            temp_filename = temp_audio.name
-
-        if self.record_audio(temp_filename):
-            if os.path.getsize(temp_filename) > 2000:
-                self.status_changed.emit("transcribing")
-                text = self.transcribe(temp_filename)
+
+        if self.streaming and self.model and not (self.use_groq or self.use_yandex):
+            self.perform_streaming_cycle()
+            return
+
+        timer = JobTimer("dictation", self.backend_name())
+        # Запись режется по паузам на сегменты, которые распознаются, пока клавиша
+        # ещё нажата: в памяти не больше текущего сегмента и очереди, после
+        # отпускания остаётся распознать только последний
+        segmenter = Endpointer(self.capture_rate, hang_ms=SEGMENT_PAUSE_MS,
+                               sensitivity=self.vad_sensitivity,
+                               min_speech_ms=SEGMENT_MIN_SPEECH_MS,
+                               min_segment_seconds=self.segment_seconds,
+                               max_segment_seconds=self.segment_seconds + 10)
+        segments = queue.Queue(maxsize=MAX_PENDING_SEGMENTS)
+        results = []
+        consumer = threading.Thread(target=self.transcribe_segments, args=(segments, results, timer),
+                                    daemon=True)
+        consumer.start()
+
+        def on_chunk(data):
+            for segment in segmenter.feed(data):
+                segments.put(segment)
+
+        recorded = False
+        try:
+            recorded = self.record_audio(on_chunk=on_chunk, timer=timer) is not None
+            tail = segmenter.flush()
+            if tail:
+                segments.put(tail)
+        finally:
+            segments.put(None)
+        if recorded:
+            self.status_changed.emit("transcribing")
+        consumer.join()
+
+        if results:
+            # Текст сегментов вставляется одним куском в порядке записи
+            text = " ".join(text for text, _ in results if text)
+            if text:
+                self.text_ready.emit(text)
+                with timer.span("paste"):
+                    self.paste_text(text)
+            self.finish_job(timer, audio_seconds=round(sum(s["original_seconds"] for _, s in results), 2),
+                            speech_seconds=round(sum(s["trimmed_seconds"] for _, s in results), 2),
+                            chars=len(text), segments=len(results))
+        elif recorded:
+            print("No speech detected, ignoring.")
                 
+        self.status_changed.emit("idle")
+
+    def transcribe_segments(self, segments, results, timer):
+        """Consumer side of hold-to-talk: transcribes segments in capture order as they arrive."""
+        while True:
+            pcm = segments.get()
+            if pcm is None:
+                break
+            try:
+                with timer.span("resample"):
+                    pcm = resample_pcm16(pcm, self.capture_rate, self.target_rate())
+                # Срезаем тишину по краям и сжимаем длинные паузы до отправки в бэкенд
+                with timer.span("trim"):
+                    pcm, trim_stats = trim_pcm16(pcm, self.target_rate())
+                if not pcm:
+                    continue
+                print(f"Segment {len(results) + 1}: {format_trim_stats(trim_stats)}")
+                results.append((self.transcribe(pcm, timer), trim_stats))
+            except Exception as e:
+                # Поток должен дочитать очередь, иначе запись встанет на put
+                self.error_occurred.emit(f"Segment Error: {e}")
+
+    def perform_hands_free_session(self):
+        """
+        Listens until the hotkey is pressed again. The endpointer cuts the
+        stream into utterances at pauses; each one is transcribed and pasted
+        by a separate thread (in order) while the next is being captured.
+        """
+        self.status_changed.emit("listening")
+        endpointer = Endpointer(self.capture_rate, hang_ms=self.vad_hang_ms,
+                                sensitivity=self.vad_sensitivity)
+        utterances = queue.Queue()
+        consumer = threading.Thread(target=self.transcribe_utterances, args=(utterances,), daemon=True)
+        consumer.start()
+
+        try:
+            chunks = iter_chunks(self.released, self.p, self.capture_rate, capture=self.capture)
+            for data in chunks:
+                for utterance in endpointer.feed(data):
+                    utterances.put((utterance, time.perf_counter()))
+            chunks.close()
+            tail = endpointer.flush()
+            if tail:
+                utterances.put((tail, time.perf_counter()))
+            self.report_capture_losses()
+        except Exception as e:
+            self.error_occurred.emit(f"Recording Error: {e}")
+        finally:
+            utterances.put(None)
+            consumer.join()
+
+        self.status_changed.emit("idle")
+
+    def transcribe_utterances(self, utterances):
+        """Consumer side of hands-free mode: transcribes queued utterances one by one."""
+        while True:
+            item = utterances.get()
+            if item is None:
+                break
+            pcm, endpointed_at = item
+            timer = JobTimer("hands_free", self.backend_name())
+            # Сколько фраза ждала, пока распознавалась предыдущая
+            timer.add("queue", timer.started - endpointed_at)
+            with timer.span("trim"):
+                pcm, trim_stats = trim_pcm16(resample_pcm16(pcm, self.capture_rate, self.target_rate()),
+                                             self.target_rate())
+            if not pcm:
+                continue
+            print(f"Utterance: {format_trim_stats(trim_stats)}")
+            self.status_changed.emit("transcribing")
+            text = self.transcribe(pcm, timer)
+            if text:
+                self.text_ready.emit(text)
+                with timer.span("paste"):
+                    self.paste_text(text + " ")
+            self.finish_job(timer, audio_seconds=round(trim_stats["original_seconds"], 2),
+                            speech_seconds=round(trim_stats["trimmed_seconds"], 2), chars=len(text))
+            if not self.released.is_set():
+                self.status_changed.emit("listening")
+
+    def perform_streaming_cycle(self):
+        """Recording cycle that decodes overlapping windows while the hotkey is held."""
+        streamer = StreamingTranscriber(self.transcribe_window, input_rate=self.capture_rate,
+                                        initial_prompt=INITIAL_PROMPT)
+        streamer.start()
+
+        timer = JobTimer("streaming", self.backend_name())
+        recorded = self.record_audio(on_chunk=streamer.feed, timer=timer) is not None
+        self.status_changed.emit("transcribing")
+        try:
+            with timer.span("finalize"):
+                text = streamer.finish()
+            if recorded and streamer.duration > 0.02:
                 if text:
                     self.text_ready.emit(text)
-                    self.paste_text(text)
+                    with timer.span("paste"):
+                        self.paste_text(text)
+                self.finish_job(timer, audio_seconds=round(streamer.duration, 2), chars=len(text))
             else:
                 print("Audio too short, ignoring.")
-        
-        if os.path.exists(temp_filename):
-            try:
-                os.remove(temp_filename)
-            except:
-                pass
-                
+        except Exception as e:
+            self.error_occurred.emit(f"Transcription Error: {e}")
+
+        gc.collect()
         self.status_changed.emit("idle")
-        # Debounce
-        time.sleep(0.5)
-
-    def record_audio(self, filename):
-        chunk = 1024
-        format = pyaudio.paInt16
-        channels = 1
-        rate = 48000 # Standard for Yandex
+
+    def transcribe_window(self, audio, prompt):
+        result = self.model.transcribe(audio, language="ru", fp16=False, initial_prompt=prompt)
+        return result["text"]
+
+    def record_audio(self, on_chunk=None, timer=None):
+        """
+        Records until the hotkey release event and returns the captured 16-bit PCM at
+        the backend rate (None if nothing was recorded). In streaming mode every
+        chunk goes to `on_chunk` at the capture rate and an empty buffer is returned.
+        Capture and resampling times are added to `timer`.
+        """
+        rate = self.capture_rate
         frames = []
+        captured = 0
+        timer = timer or JobTimer("dictation", self.backend_name())
         
         try:
-            stream = self.p.open(format=format, channels=channels, rate=rate, input=True, frames_per_buffer=chunk)
-            
             start_time = time.time()
-            max_duration = 30 # Yandex v1 limit is 30s
+            max_duration = MAX_RECORD_SECONDS
             
-            while keyboard.is_pressed(self.hotkey) and self.running:
-                if time.time() - start_time > max_duration:
-                    break
-                data = stream.read(chunk, exception_on_overflow=False)
-                frames.append(data)
-
-            stream.stop_stream()
-            stream.close()
+            with timer.span("capture"):
+                chunks = iter_chunks(self.released, self.p, rate, capture=self.capture)
+                for data in chunks:
+                    # С on_chunk звук не копится здесь, и длина записи не ограничена
+                    if on_chunk is None and time.time() - start_time > max_duration:
+                        break
+                    captured += 1
+                    if on_chunk:
+                        on_chunk(data)
+                    else:
+                        frames.append(data)
+                chunks.close()
+            self.report_capture_losses()
             
-            if not frames:
-                return False
-
-            wf = wave.open(filename, 'wb')
-            wf.setnchannels(channels)
-            wf.setsampwidth(self.p.get_sample_size(format))
-            wf.setframerate(rate)
-            wf.writeframes(b''.join(frames))
-            wf.close()
-            return True
+            if not captured:
+                return None
+
+            with timer.span("resample"):
+                return resample_pcm16(b''.join(frames), rate, self.target_rate())
             
         except Exception as e:
             self.error_occurred.emit(f"Recording Error: {e}")
-            return False
+            return None
 
-    def transcribe(self, filename):
+    def capture_stats(self):
+        """Overflow and dropped-frame counters of the always-open stream (empty if disabled)."""
+        return self.capture.stats() if self.capture else {}
+
+    def report_capture_losses(self):
+        stats = self.capture_stats()
+        if stats and stats != self._last_capture_stats:
+            print(f"Capture losses: {stats['overflows']} overflows, "
+                  f"{stats['dropped_frames']} dropped frames")
+            self._last_capture_stats = stats
+
+    def transcribe(self, pcm, timer=None):
+        """
+        Transcribes captured PCM straight from memory, without a temp WAV or ffmpeg.
+        Upload, inference and correction times are added to `timer`.
+        """
         text = ""
+        timer = timer or JobTimer("dictation", self.backend_name())
         try:
-            if self.use_groq and self.groq_client:
-                with open(filename, "rb") as file:
-                    transcription = self.groq_client.audio.transcriptions.create(
-                        file=(filename, file.read()),
-                        model="whisper-large-v3",
-                        temperature=0,
-                        language="ru",
-                        response_format="verbose_json",
-                    )
-                    text = transcription.text.strip()
-            
-            elif self.use_yandex and self.yandex_key:
-                # Read WAV and strip 44-byte header for LPCM format
-                with open(filename, "rb") as f:
-                    data = f.read()[44:] 
-                
-                params = {
-                    "lang": "ru-RU",
-                    "format": "lpcm",
-                    "sampleRateHertz": 48000,
-                    "topic": "general"
-                }
-                if self.yandex_folder_id:
-                    params["folderId"] = self.yandex_folder_id
-
-                headers = {
-                    "Authorization": f"Api-Key {self.yandex_key}"
-                }
-                
-                url = "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize"
-                response = requests.post(url, headers=headers, params=params, data=data)
-                
-                if response.status_code != 200:
-                    error_msg = response.text
-                    try:
-                        error_msg = response.json().get("error_message", response.text)
-                    except: pass
-                    self.error_occurred.emit(f"Yandex Error: {error_msg}")
-                else:
-                    result = response.json()
-                    text = result.get("result", "").strip()
-                    
-                    # --- YandexGPT Post-Processing ---
-                    if text and self.yandex_folder_id:
-                        text = self.yandex_gpt_correct(text)
-
+            source = None
+            if self.hedge and self.model and self.cloud_ready():
+                source, text = self.transcribe_hedged(pcm, timer)
+            elif self.cloud_ready():
+                source = "cloud"
+                with timer.span("upload"):
+                    text = self.recognize_cloud(pcm)
             elif self.model:
-                result = self.model.transcribe(filename, language="ru", fp16=False, initial_prompt="Привет, это проба пера. Пишем текст на русском языке.")
-                text = result["text"].strip()
+                source = "local"
+                self.ensure_model(timer)
+                with timer.span("inference"):
+                    text = self.recognize_local(pcm)
+
+            # --- YandexGPT Post-Processing ---
+            if text and source == "cloud" and self.use_yandex and self.yandex_folder_id:
+                with timer.span("gpt_correction"):
+                    text = self.yandex_gpt_correct(text, timer)
+        except CloudError as e:
+            self.error_occurred.emit(str(e))
         except Exception as e:
             self.error_occurred.emit(f"Transcription Error: {e}")
-        
-        # Cleanup
-        gc.collect()
         return text
 
-    def yandex_gpt_correct(self, text):
+    def cloud_ready(self):
+        return bool((self.use_groq and self.groq_client) or (self.use_yandex and self.yandex_key))
+
+    def recognize_cloud(self, pcm):
+        if self.use_groq:
+            return groq_transcribe_pcm(self.groq_client, pcm, self.target_rate()).strip()
+        # Длинные записи уходят несколькими запросами параллельно
+        return yandex_transcribe_pcm(pcm, self.target_rate(), self.yandex_key,
+                                     self.yandex_folder_id).strip()
+
+    def recognize_local(self, pcm):
+        audio = pcm16_to_whisper(pcm, self.target_rate())
+        result = self.model.transcribe(audio, language="ru", fp16=False, initial_prompt=INITIAL_PROMPT)
+        return result["text"].strip()
+
+    def transcribe_hedged(self, pcm, timer):
         """
-        Sends text to YandexGPT for grammar/punctuation correction 
-        using the specific instruction provided by the user.
+        Starts the cloud request, then local inference after the hedge delay
+        (or at once if the cloud fails first), and returns (source, text) of
+        the first non-empty result. The loser's result is ignored; a local
+        decode still running from a previous race is not queued behind.
         """
-        try:
-            url = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
-            
-            headers = {
-                "Authorization": f"Api-Key {self.yandex_key}",
-                "x-folder-id": self.yandex_folder_id,
-                "Content-Type": "application/json"
-            }
-            
-            prompt_instruction = (
-                "Входной текст, который тебе подается, нужно проверить на грамматику, пунктуацию, "
-                "на орфографию, выдать текст в правильном русском литературном формате. "
-                "Если это числовые или размерные параметры, то мы пишем числа 1, 2, 3 и т.п."
-            )
-            
-            data = {
-                "modelUri": f"gpt://{self.yandex_folder_id}/yandexgpt-lite/latest",
-                "completionOptions": {
-                    "stream": False,
-                    "temperature": 0.3, # Low temperature for more deterministic correction
-                    "maxTokens": 2000
-                },
-                "messages": [
-                    {
-                        "role": "system",
-                        "text": prompt_instruction
-                    },
-                    {
-                        "role": "user",
-                        "text": text
-                    }
-                ]
-            }
-            
-            response = requests.post(url, headers=headers, json=data)
-            
-            if response.status_code == 200:
-                result = response.json()
-                alternatives = result.get("result", {}).get("alternatives", [])
-                if alternatives:
-                    corrected_text = alternatives[0].get("message", {}).get("text", "")
-                    if corrected_text:
-                        print(f"YandexGPT Correction: '{text}' -> '{corrected_text}'")
-                        return corrected_text.strip()
-            else:
-                print(f"YandexGPT Error ({response.status_code}): {response.text}")
-                
-        except Exception as e:
-            print(f"YandexGPT Exception: {e}")
-            
-        return text # Return original text on failure
+        secondary = ("local", lambda: self.recognize_local(pcm))
+        if self.model.busy():
+            print("Hedging: local model busy with a previous race, cloud only")
+            secondary = None
+
+        started = time.perf_counter()
+        source, text = hedged_call(("cloud", lambda: self.recognize_cloud(pcm)), secondary,
+                                   delay=self.hedge_delay_ms / 1000, on_settled=self.record_race)
+        timer.add("upload" if source == "cloud" else "inference", time.perf_counter() - started)
+        return source, text or ""
+
+    def record_race(self, race):
+        self.hedge_stats.add(race)
+        record_job({"ts": round(time.time(), 3), "kind": "hedge", "backend": self.backend_name(),
+                    "local_model": self.model_name, "delay_ms": self.hedge_delay_ms, **race})
+        saved = f", saved {race['saved_ms']:.0f} ms" if race["saved_ms"] is not None else ""
+        print(f"Hedging: {race['winner']} won in {race['winner_ms']:.0f} ms{saved} "
+              f"({self.hedge_stats.summary()})")
+
+    def yandex_gpt_correct(self, text, timer=None):
+        """
+        Grammar/punctuation correction with YandexGPT, through the shared
+        cache; very short and already well-formed text skips the LLM call.
+        """
+        text, outcome = get_corrector().correct(text, self.yandex_key, self.yandex_folder_id)
+        if timer:
+            timer.note(correction=outcome)
+        print(f"YandexGPT: {outcome} ({get_corrector().summary()})")
+        return text
 
     def paste_text(self, text):
         try:
-            pyperclip.copy(text)
-            time.sleep(0.1)
-            keyboard.send('ctrl+v')
+            self.sink.deliver(text)
         except Exception as e:
             self.error_occurred.emit(f"Paste Error: {e}")
 
     def stop(self):
         self.running = False
+        # Будим поток, ждущий нажатия, и прерываем текущую запись
+        self.released.set()
+        self.pressed.set()
+
+class ModelPreloadWorker(QObject):
+    """Loads and warms up the local model in the background while the splash is shown."""
+    progress = pyqtSignal(int, str) # percent, stage description
+    finished = pyqtSignal()
+    error = pyqtSignal(str)
+
+    STAGES = {
+        "import": (10, "Загрузка библиотек распознавания..."),
+        "load": (40, "Загрузка модели {name}..."),
+        "warmup": (80, "Прогрев модели..."),
+        "ready": (100, "Модель готова"),
+    }
+
+    def __init__(self, model_name="small"):
+        super().__init__()
+        self.model_name = model_name
+
+    def on_stage(self, stage):
+        percent, text = self.STAGES[stage]
+        self.progress.emit(percent, text.format(name=self.model_name))
+
+    def run(self):
+        try:
+            preload_model(self.model_name, on_stage=self.on_stage)
+        except Exception as e:
+            self.error.emit(f"Model preload error: {e}")
+        self.finished.emit()
+
+class CalibrationWorker(QObject):
+    """Times the downloaded local models on this machine (see calibration.py)."""
+    progress = pyqtSignal(int, str) # percent, model being measured
+    finished = pyqtSignal(str) # results table
+    error = pyqtSignal(str)
+
+    def __init__(self, force=False):
+        super().__init__()
+        self.force = force # measure again even if results are stored
+
+    def on_progress(self, done, total, pair):
+        percent = int(done / total * 100) if total else 100
+        text = f"Замер {pair[0]} ({pair[1]})..." if pair else "Калибровка завершена"
+        self.progress.emit(percent, text)
+
+    def run(self):
+        from calibration import Calibration
+        try:
+            calibration = Calibration()
+            calibration.run(force=self.force, on_progress=self.on_progress)
+            self.finished.emit(calibration.table())
+        except Exception as e:
+            self.error.emit(f"Calibration error: {e}")
 
 class TranscribeWorker(QObject):
-    progress = pyqtSignal(int)
+    progress = pyqtSignal(int, float) # percent, ETA in seconds
     finished = pyqtSignal(str) # returns text
     error = pyqtSignal(str)
+    job_finished = pyqtSignal(dict) # stage timings of the finished job
     
     def __init__(self, file_path, api_key=None, use_groq=False, model_name="small", 
-                 use_yandex=False, yandex_key=None, yandex_folder_id=None):
+                 use_yandex=False, yandex_key=None, yandex_folder_id=None, use_cache=True):
         super().__init__()
         self.file_path = file_path
         self.api_key = api_key
@@ -293,6 +628,7 @@ class TranscribeWorker(QObject):
         self.use_yandex = use_yandex
         self.yandex_key = yandex_key
         self.yandex_folder_id = yandex_folder_id
+        self.use_cache = use_cache # False: decode again even if the audio is cached
 
     def run(self):
         try:
@@ -300,80 +636,82 @@ class TranscribeWorker(QObject):
                 self.error.emit("File not found")
                 return
 
-            text = ""
             if self.use_groq and self.api_key:
-                client = Groq(api_key=self.api_key)
-                with open(self.file_path, "rb") as file:
-                    transcription = client.audio.transcriptions.create(
-                        file=(self.file_path, file.read()),
-                        model="whisper-large-v3",
-                        temperature=0,
-                        language="ru",
-                        response_format="verbose_json",
-                    )
-                    text = transcription.text
+                timer = JobTimer("file", "groq")
+                backend, model = "groq", GROQ_MODEL
+                transcribe_fn = lambda: self.transcribe_groq(timer)
             elif self.use_yandex and self.yandex_key:
-                with open(self.file_path, "rb") as f:
-                    data = f.read()
-                
-                params = {"lang": "ru-RU", "topic": "general"}
-                if self.yandex_folder_id: params["folderId"] = self.yandex_folder_id
-                
-                headers = {"Authorization": f"Api-Key {self.yandex_key}"}
-                url = "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize"
-                
-                if self.file_path.endswith(".wav"):
-                    params["format"] = "lpcm"
-                    params["sampleRateHertz"] = 48000
-                    data = data[44:]
-
-                response = requests.post(url, headers=headers, params=params, data=data)
-                if response.status_code == 200:
-                    text = response.json().get("result", "")
-                    
-                    # --- YandexGPT Post-Processing ---
-                    if text and self.yandex_folder_id:
-                        try:
-                            # We reuse the logic. ideally this should be a shared function, 
-                            # but for now we inline it to match the GlobalSpeechWorker behavior.
-                            gpt_url = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
-                            gpt_headers = {
-                                "Authorization": f"Api-Key {self.yandex_key}",
-                                "x-folder-id": self.yandex_folder_id,
-                                "Content-Type": "application/json"
-                            }
-                            prompt_instruction = (
-                                "Входной текст, который тебе подается, нужно проверить на грамматику, пунктуацию, "
-                                "на орфографию, выдать текст в правильном русском литературном формате. "
-                                "Если это числовые или размерные параметры, то мы пишем числа 1, 2, 3 и т.п."
-                            )
-                            gpt_data = {
-                                "modelUri": f"gpt://{self.yandex_folder_id}/yandexgpt-lite/latest",
-                                "completionOptions": {"stream": False, "temperature": 0.3, "maxTokens": 2000},
-                                "messages": [
-                                    {"role": "system", "text": prompt_instruction},
-                                    {"role": "user", "text": text}
-                                ]
-                            }
-                            gpt_response = requests.post(gpt_url, headers=gpt_headers, json=gpt_data)
-                            if gpt_response.status_code == 200:
-                                alts = gpt_response.json().get("result", {}).get("alternatives", [])
-                                if alts:
-                                    corrected = alts[0].get("message", {}).get("text", "")
-                                    if corrected:
-                                        text = corrected.strip()
-                        except Exception as val_err:
-                            print(f"YandexGPT File Correction Error: {val_err}")
-
-                else:
-                    self.error.emit(f"Yandex Error: {response.text}")
-                    return
+                timer = JobTimer("file", "yandex")
+                # Исправленный YandexGPT текст кэшируется отдельно от сырого
+                backend, model = "yandex", "speechkit-v1+gpt" if self.yandex_folder_id else "speechkit-v1"
+                transcribe_fn = lambda: self.transcribe_yandex(timer)
             else:
-                model = whisper.load_model(self.model_name)
-                result = model.transcribe(self.file_path, fp16=False, language="ru")
-                text = result["text"]
+                timer = JobTimer("file", f"whisper-{model_tag(self.model_name)}")
+                backend, model = "whisper", model_tag(self.model_name)
+                transcribe_fn = lambda: self.transcribe_local(timer)
+
+            text, audio_seconds, hit = cached_transcribe(self.file_path, backend, model, transcribe_fn,
+                                                         self.use_cache)
+            timer.note(cache="hit" if hit else "miss")
+            if hit:
+                self.progress.emit(100, 0)
             
+            job = timer.finish(file=os.path.basename(self.file_path),
+                               audio_seconds=round(audio_seconds, 2), chars=len(text))
+            record_job(job)
+            self.job_finished.emit(job)
             self.finished.emit(text)
             
         except Exception as e:
-            self.error.emit(str(e))
\ No newline at end of file
+            self.error.emit(str(e))
+
+    def transcribe_groq(self, timer):
+        from groq import Groq
+        client = Groq(api_key=self.api_key)
+        with timer.span("upload"):
+            return groq_transcribe_file(client, self.file_path), 0
+
+    def transcribe_yandex(self, timer):
+        with timer.span("upload"):
+            text = yandex_transcribe_file(self.file_path, self.yandex_key, self.yandex_folder_id)
+
+        # --- YandexGPT Post-Processing ---
+        if text and self.yandex_folder_id:
+            with timer.span("gpt_correction"):
+                text, outcome = get_corrector().correct(text, self.yandex_key, self.yandex_folder_id)
+            timer.note(correction=outcome)
+        return text, 0
+
+    def transcribe_local(self, timer):
+        from transcribe import transcribe_chunked
+        with timer.span("inference"):
+            return transcribe_chunked(self.file_path, self.model_name, on_progress=self.progress.emit)
+
+class BatchTranscribeWorker(QObject):
+    progress = pyqtSignal(int)
+    file_done = pyqtSignal(str, str) # path, text or error message
+    finished = pyqtSignal(str) # returns summary
+    error = pyqtSignal(str)
+
+    def __init__(self, file_paths, use_groq=False, model_name="small", workers=None, use_cache=True):
+        super().__init__()
+        self.file_paths = file_paths
+        self.use_groq = use_groq
+        self.model_name = model_name
+        self.workers = workers
+        self.use_cache = use_cache
+
+    def run(self):
+        try:
+            from transcribe import format_summary, transcribe_batch
+
+            def on_result(result, done, total):
+                self.file_done.emit(result["path"], result["error"] or result["text"])
+                self.progress.emit(int(done * 100 / total))
+
+            summary = transcribe_batch(self.file_paths, model_name=self.model_name,
+                                       use_api=self.use_groq, workers=self.workers,
+                                       on_result=on_result, use_cache=self.use_cache)
+            self.finished.emit(format_summary(summary))
+        except Exception as e:
+            self.error.emit(str(e))
@@ -0,0 +1,158 @@
+import io
+import wave
+
+import numpy as np
+
+try:
+    import soundfile
+except ImportError:  # без libsndfile облака получают несжатый WAV/LPCM
+    soundfile = None
+
+# Частота, с которой работает Whisper
+WHISPER_SAMPLE_RATE = 16000
+
+# Кодеки для загрузки в облако: имя -> (формат soundfile, подтип, расширение файла)
+UPLOAD_CODECS = {
+    "flac": ("FLAC", "PCM_16", "flac"),
+    "opus": ("OGG", "OPUS", "ogg"),
+}
+# Частоты, которые допускает Opus
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def pcm16_to_float32(data):
+    """Converts raw 16-bit little-endian PCM bytes to float32 samples in [-1, 1)."""
+    return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+# Длина FIR-фильтра антиалиасинга (нечётная, чтобы фильтр был симметричным)
+LOWPASS_TAPS = 63
+
+
+def _lowpass(audio, cutoff):
+    """Windowed-sinc low-pass; `cutoff` is a fraction of the source Nyquist rate."""
+    n = np.arange(LOWPASS_TAPS) - (LOWPASS_TAPS - 1) / 2
+    taps = cutoff * np.sinc(cutoff * n) * np.hanning(LOWPASS_TAPS)
+    taps /= taps.sum()
+    # mode="same" отдаёт max(len(audio), LOWPASS_TAPS) отсчётов и удлиняет короткий сигнал,
+    # поэтому берём из полной свёртки центрированный кусок длины сигнала
+    delay = (LOWPASS_TAPS - 1) // 2
+    return np.convolve(audio, taps.astype(np.float32))[delay:delay + len(audio)]
+
+
+def resample(audio, src_rate, dst_rate):
+    """
+    Resamples a mono float32 signal. Downsampling is low-pass filtered first;
+    integer ratios (48000 -> 16000) are plain decimation, others use linear
+    interpolation. Everything is vectorized, no ffmpeg involved.
+    """
+    if src_rate == dst_rate or len(audio) == 0:
+        return audio
+    if dst_rate < src_rate:
+        audio = _lowpass(audio, dst_rate / src_rate)
+        if src_rate % dst_rate == 0:
+            return np.ascontiguousarray(audio[::src_rate // dst_rate], dtype=np.float32)
+    dst_len = int(round(len(audio) * dst_rate / src_rate))
+    src_positions = np.arange(dst_len, dtype=np.float64) * (src_rate / dst_rate)
+    return np.interp(src_positions, np.arange(len(audio)), audio).astype(np.float32)
+
+
+def float32_to_pcm16(audio):
+    """Converts float32 samples in [-1, 1) back to raw 16-bit PCM bytes."""
+    return (np.clip(audio, -1.0, 1.0 - 1.0 / 32768) * 32768).astype(np.int16).tobytes()
+
+
+def resample_pcm16(data, src_rate, dst_rate):
+    """Resamples raw 16-bit PCM bytes, returning 16-bit PCM bytes."""
+    if src_rate == dst_rate or not data:
+        return data
+    return float32_to_pcm16(resample(pcm16_to_float32(data), src_rate, dst_rate))
+
+
+def synth_utterance(seconds, rate=WHISPER_SAMPLE_RATE, seed=0):
+    """Speech-like signal: harmonic syllable bursts separated by short pauses."""
+    rng = np.random.default_rng(seed)
+    audio = rng.normal(0, 0.002, int(seconds * rate)).astype(np.float32)
+    pos = int(0.15 * rate)
+    while pos < len(audio) - int(0.15 * rate):
+        length = int(rng.uniform(0.15, 0.4) * rate)
+        t = np.arange(min(length, len(audio) - pos)) / rate
+        pitch = rng.uniform(110, 220)
+        burst = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in (1, 2, 3))
+        audio[pos:pos + len(t)] += 0.15 * np.hanning(len(t)) * burst
+        pos += length + int(rng.uniform(0.05, 0.35) * rate)
+    return np.clip(audio, -1, 1)
+
+
+def load_file_float32(file_path, rate=WHISPER_SAMPLE_RATE):
+    """
+    Decodes any audio file into float32 mono at `rate`: through ffmpeg with
+    openai-whisper, or with faster-whisper's decoder when only it is installed.
+    """
+    try:
+        from whisper.audio import load_audio
+    except ImportError:
+        from faster_whisper import decode_audio
+        return decode_audio(file_path, sampling_rate=rate)
+    return load_audio(file_path, sr=rate)
+
+
+def load_file_pcm16(file_path, rate=WHISPER_SAMPLE_RATE):
+    """Decodes any audio file into raw 16-bit mono PCM at `rate`."""
+    return float32_to_pcm16(load_file_float32(file_path, rate))
+
+
+def negotiate_capture_rate(p, target_rate, sample_format):
+    """
+    Returns `target_rate` if the default input device can capture at it,
+    otherwise the device's native rate (audio is then resampled in-process).
+    """
+    try:
+        info = p.get_default_input_device_info()
+    except IOError:
+        # Нет устройства по умолчанию — ошибку покажет само открытие потока
+        return target_rate
+    try:
+        if p.is_format_supported(target_rate, input_device=info["index"],
+                                 input_channels=1, input_format=sample_format):
+            return target_rate
+    except ValueError:
+        # PyAudio сообщает о неподдерживаемом формате исключением
+        pass
+    return int(info["defaultSampleRate"])
+
+
+def pcm16_to_whisper(data, rate):
+    """Prepares captured 16-bit PCM for `model.transcribe`: float32 mono at 16 kHz."""
+    return resample(pcm16_to_float32(data), rate, WHISPER_SAMPLE_RATE)
+
+
+def wav_bytes(data, rate, channels=1):
+    """Wraps raw 16-bit PCM into an in-memory WAV container."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(data)
+    return buffer.getvalue()
+
+
+def encode_audio(data, rate, codec):
+    """
+    Compresses 16-bit mono PCM for upload. Returns (bytes, extension, rate);
+    the rate can change because Opus only supports a fixed set of rates.
+    Falls back to WAV for codec "wav" or when soundfile is not installed.
+    """
+    if codec not in UPLOAD_CODECS or soundfile is None:
+        return wav_bytes(data, rate), "wav", rate
+
+    if codec == "opus" and rate not in OPUS_RATES:
+        data = resample_pcm16(data, rate, WHISPER_SAMPLE_RATE)
+        rate = WHISPER_SAMPLE_RATE
+
+    file_format, subtype, extension = UPLOAD_CODECS[codec]
+    buffer = io.BytesIO()
+    soundfile.write(buffer, np.frombuffer(data, dtype=np.int16), rate,
+                    format=file_format, subtype=subtype)
+    return buffer.getvalue(), extension, rate
@@ -0,0 +1,327 @@
+"""
+Headless release-to-paste latency benchmark for GlobalSpeechWorker.
+
+Runs the real dictation cycle without a microphone, keyboard or network:
+WAV fixtures are played through a fake PyAudio device (a stub `pyaudio`
+module, so PortAudio need not be installed), the hotkey press and release
+go through the worker's own handlers, Groq and Yandex are replaced by a
+local HTTP stub with configurable latency, and pasting is captured instead
+of sent to the OS. Reports p50/p95/p99 per backend and per utterance length.
+
+Examples:
+    python benchmarks/dictation_latency.py
+    python benchmarks/dictation_latency.py --fixtures my_wavs --runs 20 --latency-ms 400 --jitter-ms 150
+    python benchmarks/dictation_latency.py --backends groq,yandex,local --model tiny --capture continuous
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import types
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "Frontend"))
+
+from audio_utils import WHISPER_SAMPLE_RATE, float32_to_pcm16, resample_pcm16, synth_utterance
+
+STUB_TEXT = "проверка задержки диктовки"
+FIXTURE_SECONDS = (2, 5, 15, 45)
+# Сколько держим "клавишу" после конца фразы, как живой человек
+RELEASE_TAIL_SECONDS = 0.2
+
+
+class FakeInputStream:
+    """Input stream of FakePyAudio, paced in real time by the stream clock."""
+
+    def __init__(self, device, rate, chunk, callback=None):
+        self.device = device
+        self.rate = rate
+        self.chunk = chunk
+        self.callback = callback
+        self.started = time.perf_counter()
+        self.delivered = 0
+        self.active = False
+        self._thread = None
+        if callback is None:
+            self.active = True
+
+    def read(self, frames, exception_on_overflow=True):
+        self.delivered += frames
+        delay = self.started + self.delivered / self.rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        return self.device.take(frames, self.rate)
+
+    def start_stream(self):
+        self.active = True
+        self.started = time.perf_counter()
+        self.delivered = 0
+        if self.callback:
+            self._thread = threading.Thread(target=self._pump, daemon=True)
+            self._thread.start()
+
+    def _pump(self):
+        while self.active:
+            data = self.read(self.chunk)
+            self.callback(data, self.chunk, None, 0)
+
+    def stop_stream(self):
+        self.active = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop_stream()
+
+
+class FakePyAudio:
+    """
+    Stand-in for pyaudio.PyAudio with one input device. `play(pcm)` starts a
+    fixture on the "microphone"; before and after it the device yields silence.
+    """
+
+    def __init__(self, rate=WHISPER_SAMPLE_RATE):
+        self.rate = rate
+        self._pcm = b""
+        self._pos = 0
+        self._lock = threading.Lock()
+
+    def play(self, pcm):
+        with self._lock:
+            self._pcm = pcm
+            self._pos = 0
+
+    def take(self, frames, rate):
+        size = frames * 2
+        with self._lock:
+            data = self._pcm[self._pos:self._pos + size]
+            self._pos += len(data)
+        return data + b"\x00" * (size - len(data))
+
+    def get_default_input_device_info(self):
+        return {"index": 0, "defaultSampleRate": float(self.rate)}
+
+    def is_format_supported(self, rate, **kwargs):
+        if rate != self.rate:
+            raise ValueError("Invalid sample rate")
+        return True
+
+    def get_sample_size(self, sample_format):
+        return 2
+
+    def open(self, format=None, channels=1, rate=None, input=True, frames_per_buffer=1024,
+             stream_callback=None, **kwargs):
+        return FakeInputStream(self, rate or self.rate, frames_per_buffer, stream_callback)
+
+    def terminate(self):
+        pass
+
+
+def install_fake_pyaudio(device):
+    """
+    Registers a stub `pyaudio` module whose PyAudio() returns `device`. Must run
+    before `workers` (and through it `capture`) is imported, so the benchmark
+    needs neither PyAudio nor PortAudio.
+    """
+    module = sys.modules.get("pyaudio")
+    if not getattr(module, "BENCHMARK_STUB", False):
+        module = types.ModuleType("pyaudio")
+        module.BENCHMARK_STUB = True
+        # Значения констант как в PyAudio
+        module.paInt16 = 8
+        module.paInputOverflow = 2
+        module.paContinue = 0
+        sys.modules["pyaudio"] = module
+    module.PyAudio = lambda: device
+    return module
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers SpeechKit and Groq transcription requests after a simulated delay."""
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        server = self.server
+        time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+
+        if "stt:recognize" in self.path:
+            body = {"result": STUB_TEXT}
+        elif "transcriptions" in self.path:
+            body = {"text": STUB_TEXT, "language": "ru", "duration": 0, "segments": []}
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(latency_ms, jitter_ms):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.latency = latency_ms / 1000
+    server.jitter = jitter_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_fixtures(directory):
+    for seconds in FIXTURE_SECONDS:
+        path = os.path.join(directory, f"utterance_{seconds:02d}s.wav")
+        with wave.open(path, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(WHISPER_SAMPLE_RATE)
+            wf.writeframes(float32_to_pcm16(synth_utterance(seconds, seed=seconds)))
+
+
+def load_fixtures(directory, rate):
+    """Returns [(name, pcm_at_rate, seconds)] for every 16-bit WAV in `directory`."""
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(".wav"):
+            continue
+        with wave.open(os.path.join(directory, name), "rb") as wf:
+            if wf.getsampwidth() != 2:
+                print(f"Skipping {name}: only 16-bit WAV is supported")
+                continue
+            samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+            if wf.getnchannels() > 1:
+                samples = samples.reshape(-1, wf.getnchannels()).mean(axis=1).astype(np.int16)
+            pcm = resample_pcm16(samples.tobytes(), wf.getframerate(), rate)
+        fixtures.append((name, pcm, len(pcm) / (rate * 2)))
+    return fixtures
+
+
+def make_worker(backend, device, args):
+    # initialize() открывает устройство через pyaudio.PyAudio() — подменяем модуль целиком
+    install_fake_pyaudio(device)
+    from workers import GlobalSpeechWorker
+
+    worker = GlobalSpeechWorker(
+        api_key="benchmark",
+        yandex_key="benchmark",
+        model_name=args.model,
+        use_groq=backend == "groq",
+        use_yandex=backend == "yandex",
+        continuous_capture=args.capture == "continuous",
+        streaming=args.streaming,
+        # Текст не уходит в ОС — заглушка только фиксирует момент вставки
+        paste_mode="fake",
+    )
+    worker.errors = []
+    worker.error_occurred.connect(worker.errors.append)
+    worker.initialize()
+    if worker.errors:
+        raise RuntimeError(worker.errors[0])
+    worker.pasted = worker.sink.delivered
+    return worker
+
+
+def run_cycle(worker, device, pcm, seconds):
+    """One press-speak-release cycle; returns release-to-paste seconds or None."""
+    worker.pasted.clear()
+    released_at = []
+
+    def speak_and_release():
+        time.sleep(seconds + RELEASE_TAIL_SECONDS)
+        released_at.append(time.perf_counter())
+        worker.on_hotkey_release(None)
+
+    worker.on_hotkey_press(None)
+    worker.pressed.clear()
+    device.play(pcm)
+    releaser = threading.Thread(target=speak_and_release)
+    releaser.start()
+    try:
+        worker.perform_recording_cycle()
+    finally:
+        releaser.join()
+        worker.recording = False
+    if not worker.pasted:
+        return None
+    return worker.pasted[0][0] - released_at[0]
+
+
+def percentiles(values):
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return p50, p95, p99
+
+
+def print_report(results):
+    print(f"\n{'backend':<8} {'fixture':<22} {'len':>6} {'n':>4} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'failed':>6}")
+    for (backend, name, seconds), latencies in results.items():
+        ok = [x for x in latencies if x is not None]
+        failed = len(latencies) - len(ok)
+        if ok:
+            p50, p95, p99 = (v * 1000 for v in percentiles(ok))
+            print(f"{backend:<8} {name:<22} {seconds:>5.1f}s {len(ok):>4} {p50:>8.0f} {p95:>8.0f} "
+                  f"{p99:>8.0f} {failed:>6}")
+        else:
+            print(f"{backend:<8} {name:<22} {seconds:>5.1f}s {0:>4} {'-':>8} {'-':>8} {'-':>8} {failed:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless release-to-paste latency benchmark.")
+    parser.add_argument("--fixtures", help="directory with 16-bit WAV fixtures (synthesized if omitted)")
+    parser.add_argument("--backends", default="groq,yandex", help="comma-separated: groq, yandex, local")
+    parser.add_argument("--runs", type=int, default=5, help="cycles per fixture and backend")
+    parser.add_argument("--latency-ms", type=float, default=300, help="stub server response delay")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="uniform +/- jitter of the delay")
+    parser.add_argument("--model", default="tiny", help="Whisper model for the local backend")
+    parser.add_argument("--capture", choices=("on_demand", "continuous"), default="on_demand")
+    parser.add_argument("--streaming", action="store_true", help="streaming mode for the local backend")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.latency_ms, args.jitter_ms)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["YANDEX_STT_URL"] = f"{base_url}/speech/v1/stt:recognize"
+    os.environ["GROQ_BASE_URL"] = base_url
+    os.environ["NO_PROXY"] = "127.0.0.1,localhost"
+
+    fixture_dir = args.fixtures
+    if not fixture_dir:
+        fixture_dir = tempfile.mkdtemp(prefix="dictation_fixtures_")
+        write_fixtures(fixture_dir)
+
+    results = {}
+    for backend in args.backends.split(","):
+        backend = backend.strip()
+        device = FakePyAudio()
+        worker = make_worker(backend, device, args)
+        fixtures = load_fixtures(fixture_dir, worker.capture_rate)
+        print(f"{backend}: {len(fixtures)} fixture(s) x {args.runs} run(s), capture {args.capture}")
+        try:
+            for name, pcm, seconds in fixtures:
+                latencies = results.setdefault((backend, name, seconds), [])
+                for _ in range(args.runs):
+                    latencies.append(run_cycle(worker, device, pcm, seconds))
+        finally:
+            if worker.capture:
+                worker.capture.close()
+        for error in worker.errors:
+            print(f"  {backend} error: {error}")
+
+    server.shutdown()
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Speed and memory of the local engines: openai-whisper on PyTorch (fp32) vs
+faster-whisper on CTranslate2 (int8), for the same model names.
+
+Every (engine, model) pair runs in a fresh process, so peak RSS belongs to
+that pair alone and load time is a cold start. Reported per pair: load
+time, first (cold) decode, mean warm decode, real-time factor (warm decode
+/ audio length), peak RSS.
+
+"pytorch-mmap" loads the memory-mapped weights (MMAP_WEIGHTS); run it
+twice, since the first run converts the checkpoint.
+
+Examples:
+    python benchmarks/local_engines.py --audio sample.wav
+    python benchmarks/local_engines.py --models small,medium,turbo --runs 5 --json engines.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from audio_utils import WHISPER_SAMPLE_RATE, load_file_float32, synth_utterance
+
+# pytorch-mmap — PyTorch с весами, отображёнными в память (MMAP_WEIGHTS=1)
+ENGINES = ("pytorch", "pytorch-mmap", "ctranslate2")
+
+
+def load_audio(path, seconds):
+    if path:
+        return load_file_float32(path)
+    print("No --audio given: using a synthetic signal, decode times on real speech will differ")
+    return synth_utterance(seconds)
+
+
+def measure(engine, model_name, audio, runs, threads):
+    """Runs in a child process: load, one cold and `runs` warm decodes."""
+    from metrics import peak_rss_mb
+    from model_registry import registry
+
+    label = engine
+    os.environ["MMAP_WEIGHTS"] = "1" if engine == "pytorch-mmap" else "0"
+    if engine == "pytorch-mmap":
+        engine = "pytorch"
+    registry.cpu_threads = threads
+    if engine == "pytorch" and threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    baseline_mb = peak_rss_mb()
+    started = time.perf_counter()
+    model = registry.get(model_name, device="cpu", engine=engine)
+    load_seconds = time.perf_counter() - started
+
+    def decode():
+        started = time.perf_counter()
+        text = model.transcribe(audio, language="ru", fp16=False, temperature=0.0)["text"]
+        return time.perf_counter() - started, text
+
+    cold_seconds, text = decode()
+    warm = [decode()[0] for _ in range(runs)]
+    warm_seconds = sum(warm) / len(warm)
+    return {
+        "engine": label,
+        "model": model_name,
+        "load_s": round(load_seconds, 2),
+        "cold_s": round(cold_seconds, 2),
+        "warm_s": round(warm_seconds, 2),
+        "rtf": round(warm_seconds / (len(audio) / WHISPER_SAMPLE_RATE), 3),
+        "peak_rss_mb": round(peak_rss_mb(), 0),
+        "model_rss_mb": round(peak_rss_mb() - baseline_mb, 0),
+        "model_size_mb": round(model.size_mb, 0),
+        "text": text.strip(),
+    }
+
+
+def run_isolated(engine, model_name, audio, runs, threads):
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(measure, engine, model_name, audio, runs, threads).result()
+
+
+def print_report(results, audio_seconds):
+    print(f"\nAudio: {audio_seconds:.1f}s")
+    print(f"{'engine':<12} {'model':<8} {'load s':>7} {'cold s':>7} {'warm s':>7} {'RTF':>6} "
+          f"{'peak MB':>8} {'size MB':>8}")
+    for r in results:
+        print(f"{r['engine']:<12} {r['model']:<8} {r['load_s']:>7.2f} {r['cold_s']:>7.2f} "
+              f"{r['warm_s']:>7.2f} {r['rtf']:>6.3f} {r['peak_rss_mb']:>8.0f} {r['model_size_mb']:>8.0f}")
+
+    by_key = {(r["engine"], r["model"]): r for r in results}
+    for model_name in dict.fromkeys(r["model"] for r in results):
+        base, fast = by_key.get(("pytorch", model_name)), by_key.get(("ctranslate2", model_name))
+        if base and fast:
+            print(f"{model_name}: CTranslate2 int8 is {base['warm_s'] / fast['warm_s']:.1f}x faster, "
+                  f"peak RSS {fast['peak_rss_mb'] - base['peak_rss_mb']:+.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PyTorch and CTranslate2 local engines.")
+    parser.add_argument("--audio", help="speech recording to decode (synthetic signal if omitted)")
+    parser.add_argument("--seconds", type=float, default=10, help="length of the synthetic signal")
+    parser.add_argument("--models", default="tiny,base,small", help="comma-separated model names")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma-separated engines")
+    parser.add_argument("--runs", type=int, default=3, help="warm decodes per pair")
+    parser.add_argument("--threads", type=int, default=0, help="CPU threads per engine (0 = default)")
+    parser.add_argument("--json", help="also write results to this JSON file")
+    args = parser.parse_args()
+
+    audio = load_audio(args.audio, args.seconds)
+    results = []
+    for model_name in args.models.split(","):
+        for engine in args.engines.split(","):
+            print(f"Measuring {engine} / {model_name}...")
+            try:
+                results.append(run_isolated(engine.strip(), model_name.strip(), audio, args.runs, args.threads))
+            except Exception as e:
+                print(f"  failed: {e}")
+
+    print_report(results, len(audio) / WHISPER_SAMPLE_RATE)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import data_path
+
+# От наименее к наиболее точной; turbo (large-v3-turbo) точнее medium, но уступает large
+MODELS = ("tiny", "base", "small", "medium", "turbo", "large")
+DEFAULT_BUDGET_MS = 1500
+# Эталонные записи речи, поставляемые с программой
+BUNDLED_CLIPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibration_clips")
+# Запасные синтетические фразы (секунды): короткая реплика и длинное предложение
+REFERENCE_SECONDS = (3, 10)
+SYNTHETIC_PREFIX = "synthetic_"
+CLIP_EXTENSIONS = (".wav", ".mp3", ".ogg", ".flac", ".m4a")
+
+
+def latency_budget_ms():
+    """Release-to-paste budget for local decoding (LATENCY_BUDGET_MS)."""
+    return int(os.getenv("LATENCY_BUDGET_MS", DEFAULT_BUDGET_MS))
+
+
+def calibration_path():
+    return os.getenv("CALIBRATION_FILE") or data_path("calibration.json")
+
+
+def downloaded_models():
+    """Models present in the standard openai-whisper cache, in accuracy order."""
+    from model_registry import whisper_cache_dir
+
+    downloaded = set()
+    cache_dir = whisper_cache_dir()
+    try:
+        for f in os.listdir(cache_dir):
+            if f.endswith(".pt"):
+                # Имена вида 'small.pt', 'large-v3.pt', 'large-v3-turbo.pt'
+                if "turbo" in f:
+                    downloaded.add("turbo")
+                    continue
+                downloaded.update(m for m in MODELS if f.startswith(m))
+    except OSError:
+        pass
+    return [m for m in MODELS if m in downloaded]
+
+
+def ct2_downloaded(name):
+    """True if faster-whisper is installed and has the CTranslate2 weights of `name` locally."""
+    try:
+        from faster_whisper.utils import download_model
+        download_model(name, local_files_only=True)
+        return True
+    except Exception:
+        return False
+
+
+def candidates(models=None):
+    """(model, engine) pairs to time: every downloaded model, CTranslate2 where its weights exist."""
+    pairs = []
+    for name in models or downloaded_models():
+        pairs.append((name, "pytorch"))
+        if ct2_downloaded(name):
+            pairs.append((name, "ctranslate2"))
+    return pairs
+
+
+def reference_clips():
+    """
+    [(name, float32 audio)]: speech recordings from CALIBRATION_CLIPS_DIR or,
+    if unset, the bundled calibration_clips/. Without any recordings falls back
+    to synthetic tones, which Whisper decodes to little or no text, so the
+    latency comes out optimistic — a warning is printed and the results are
+    marked (see `is_synthetic`).
+    """
+    from audio_utils import WHISPER_SAMPLE_RATE, load_file_float32, synth_utterance
+
+    for directory in (os.getenv("CALIBRATION_CLIPS_DIR"), BUNDLED_CLIPS_DIR):
+        if directory and os.path.isdir(directory):
+            clips = [(f, load_file_float32(os.path.join(directory, f))) for f in sorted(os.listdir(directory))
+                     if f.lower().endswith(CLIP_EXTENSIONS)]
+            if clips:
+                return clips
+    print("Calibration: no speech recordings found, timing synthetic clips; "
+          "latency will be underestimated (set CALIBRATION_CLIPS_DIR)")
+    return [(f"{SYNTHETIC_PREFIX}{seconds}s", synth_utterance(seconds, WHISPER_SAMPLE_RATE, seed=seconds))
+            for seconds in REFERENCE_SECONDS]
+
+
+def is_synthetic(clip_names):
+    """True if the clips are the synthetic fallback rather than speech."""
+    return any(name.startswith(SYNTHETIC_PREFIX) for name in clip_names)
+
+
+def machine_id():
+    """Identifies the hardware the results were measured on."""
+    return {
+        "node": platform.node(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def measure(name, engine, clips, runs=2):
+    """
+    Runs in a child process: load, warm up, then `runs` decodes of every clip
+    with the dictation settings. The latency is the mean decode time of the
+    longest clip — what the user waits for after releasing the key.
+    """
+    from audio_utils import WHISPER_SAMPLE_RATE
+    from metrics import peak_rss_mb
+    from model_registry import registry, warm_up
+
+    baseline_mb = peak_rss_mb()
+    started = time.perf_counter()
+    model = registry.get(name, engine=engine)
+    load_seconds = time.perf_counter() - started
+    warm_up(model)
+
+    decode_seconds = {}
+    for clip_name, audio in clips:
+        times = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            model.transcribe(audio, language="ru", fp16=False, temperature=0.0,
+                             condition_on_previous_text=False)
+            times.append(time.perf_counter() - started)
+        decode_seconds[clip_name] = sum(times) / len(times)
+
+    longest = max(clips, key=lambda clip: len(clip[1]))[0]
+    audio_seconds = sum(len(audio) for _, audio in clips) / WHISPER_SAMPLE_RATE
+    return {
+        "model": name,
+        "engine": engine,
+        "device": model.device,
+        "load_s": round(load_seconds, 2),
+        "latency_ms": round(decode_seconds[longest] * 1000),
+        "rtf": round(sum(decode_seconds.values()) / audio_seconds, 3),
+        "peak_rss_mb": round(peak_rss_mb()),
+        "model_rss_mb": round(peak_rss_mb() - baseline_mb),
+        "measured_at": round(time.time()),
+        # Синтетика распознаётся почти в пустой текст: задержка занижена
+        "synthetic": is_synthetic([clip_name for clip_name, _ in clips]),
+    }
+
+
+class Calibration:
+    """Stored calibration results of this machine, keyed "engine:model"."""
+
+    def __init__(self, path=None):
+        self.path = path or calibration_path()
+        self.results = {}
+        self.clips = []
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Результаты с другого компьютера (перенесённый профиль) не годятся
+        if data.get("machine") == machine_id():
+            self.results = data.get("results", {})
+            self.clips = data.get("clips", [])
+
+    @property
+    def synthetic(self):
+        """True if the stored results were timed on synthetic clips instead of speech."""
+        return is_synthetic(self.clips)
+
+    def save(self):
+        data = {"machine": machine_id(), "clips": self.clips, "synthetic": self.synthetic,
+                "results": self.results}
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Calibration write error: {e}")
+
+    def result(self, name, engine="pytorch"):
+        return self.results.get(f"{engine}:{name}")
+
+    def run(self, pairs=None, force=False, on_progress=None, runs=2):
+        """
+        Times every (model, engine) pair not measured yet (all of them with
+        `force`), one fresh process per pair, saving after each. `on_progress`
+        gets (done, total, pair). Returns the pairs that failed to load.
+        """
+        clips = reference_clips()
+        clip_names = [name for name, _ in clips]
+        if clip_names != self.clips:
+            # Другие эталонные записи — старые замеры несравнимы с новыми
+            self.results, self.clips = {}, clip_names
+        pairs = candidates() if pairs is None else pairs
+        todo = [pair for pair in pairs if force or not self.result(*pair)]
+        failed = []
+        context = multiprocessing.get_context("spawn")
+        for done, (name, engine) in enumerate(todo):
+            if on_progress:
+                on_progress(done, len(todo), (name, engine))
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    result = pool.submit(measure, name, engine, clips, runs).result()
+            except Exception as e:
+                print(f"Calibration of {name} ({engine}) failed: {e}")
+                failed.append((name, engine))
+                continue
+            self.results[f"{engine}:{name}"] = result
+            print(f"Calibration: {name} ({engine}) {result['latency_ms']} ms, "
+                  f"RTF {result['rtf']}, peak {result['peak_rss_mb']} MB")
+            self.save()
+        if on_progress:
+            on_progress(len(todo), len(todo), None)
+        return failed
+
+    def recommend(self, budget_ms=None, memory_mb=None, engine=None):
+        """
+        The most accurate measured (model, engine) whose latency fits `budget_ms`
+        and whose memory fits `memory_mb` (MODEL_MEMORY_BUDGET_MB; 0 — any);
+        between engines of one model the faster wins (only `engine`'s results
+        are considered if given). Falls back to the
+        fastest measured pair. Returns (result dict, fits) or (None, False);
+        the latter also for results timed on synthetic clips, which understate
+        the latency too much to pick a model from.
+        """
+        if self.synthetic:
+            return None, False
+        budget_ms = latency_budget_ms() if budget_ms is None else budget_ms
+        if memory_mb is None:
+            memory_mb = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+        measured = [r for r in self.results.values()
+                    if r["model"] in MODELS and (engine is None or r["engine"] == engine)]
+        if not measured:
+            return None, False
+        fitting = [r for r in measured
+                   if r["latency_ms"] <= budget_ms and (not memory_mb or r["model_rss_mb"] <= memory_mb)]
+        if not fitting:
+            return min(measured, key=lambda r: r["latency_ms"]), False
+        return max(fitting, key=lambda r: (MODELS.index(r["model"]), -r["latency_ms"])), True
+
+    def table(self):
+        rows = sorted(self.results.values(), key=lambda r: (MODELS.index(r["model"]), r["engine"]))
+        lines = [f"{'model':<8} {'engine':<12} {'latency':>8} {'RTF':>6} {'peak MB':>8}"]
+        lines += [f"{r['model']:<8} {r['engine']:<12} {r['latency_ms']:>6} ms {r['rtf']:>6.3f} "
+                  f"{r['peak_rss_mb']:>8}" for r in rows]
+        if self.synthetic:
+            lines.append("Measured on synthetic clips: real speech decodes slower")
+        return "\n".join(lines)
+
+
+def recommended_model():
+    """(model, engine) recommended from stored results without measuring, or None."""
+    best, _ = Calibration().recommend()
+    return (best["model"], best["engine"]) if best else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time downloaded Whisper models and pick one for this machine.")
+    parser.add_argument("--budget-ms", type=int, default=None,
+                        help=f"release-to-paste budget (LATENCY_BUDGET_MS, default {DEFAULT_BUDGET_MS})")
+    parser.add_argument("--models", help="comma-separated models (default: all downloaded)")
+    parser.add_argument("--force", action="store_true", help="measure again even if results are stored")
+    parser.add_argument("--runs", type=int, default=2, help="decodes per clip")
+    args = parser.parse_args()
+
+    calibration = Calibration()
+    pairs = candidates(args.models.split(",")) if args.models else None
+    calibration.run(pairs, force=args.force, runs=args.runs)
+    if not calibration.results:
+        print("Нет скачанных моделей для калибровки")
+        return
+    print(calibration.table())
+    if calibration.synthetic:
+        print("Замер сделан на синтетических фразах: на реальной речи задержка больше, модель не "
+              "рекомендуется. Положите записи своей речи в calibration_clips/ или CALIBRATION_CLIPS_DIR "
+              "и запустите калибровку с --force.")
+        return
+    best, fits = calibration.recommend(args.budget_ms)
+    budget = args.budget_ms or latency_budget_ms()
+    if fits:
+        print(f"Рекомендуется: {best['model']} ({best['engine']}), {best['latency_ms']} мс при бюджете {budget} мс")
+    else:
+        print(f"Ни одна модель не укладывается в {budget} мс; самая быстрая: "
+              f"{best['model']} ({best['engine']}), {best['latency_ms']} мс")
+
+
+if __name__ == "__main__":
+    main()
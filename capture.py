@@ -0,0 +1,127 @@
+import threading
+
+import numpy as np
+import pyaudio
+
+
+class RingBuffer:
+    """
+    Preallocated circular buffer of int16 samples. Positions are absolute
+    sample counters, so readers can tell how much they missed after a wrap.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.int16)
+        self.written = 0  # всего записано сэмплов с момента создания
+
+    def write(self, samples):
+        n = len(samples)
+        if n >= self.capacity:
+            samples = samples[-self.capacity:]
+            self.written += n - self.capacity
+            n = self.capacity
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        self._data[:n - first] = samples[first:]
+        self.written += n
+
+    def read(self, position):
+        """Returns samples from absolute `position` to the write head."""
+        n = self.written - position
+        start = position % self.capacity
+        first = min(n, self.capacity - start)
+        return np.concatenate((self._data[start:start + first], self._data[:n - first]))
+
+
+class ContinuousCapture:
+    """
+    Keeps one PyAudio input stream open in callback mode and writes it into
+    a ring buffer, so recording starts without opening the device and the
+    last `preroll_seconds` before the hotkey press are included. Device
+    overflows and samples lost because a reader fell behind are counted.
+    """
+
+    def __init__(self, p, rate, preroll_seconds=0.3, buffer_seconds=30, chunk=None):
+        self.p = p
+        self.rate = rate
+        self.chunk = chunk or rate // 50
+        self.preroll = int(preroll_seconds * rate)
+        self.ring = RingBuffer(int(buffer_seconds * rate) + self.preroll)
+        self.overflows = 0
+        self.dropped_frames = 0
+        self._cond = threading.Condition()
+        self._stream = None
+
+    def start(self):
+        self._stream = self.p.open(format=pyaudio.paInt16, channels=1, rate=self.rate, input=True,
+                                   frames_per_buffer=self.chunk, stream_callback=self._callback)
+        self._stream.start_stream()
+
+    def close(self):
+        if self._stream:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paInputOverflow:
+            self.overflows += 1
+        with self._cond:
+            self.ring.write(np.frombuffer(in_data, dtype=np.int16))
+            self._cond.notify_all()
+        return None, pyaudio.paContinue
+
+    def mark(self):
+        """Start position for a new recording, including the pre-roll."""
+        with self._cond:
+            return max(0, self.ring.written - self.preroll)
+
+    def read(self, position, timeout=0.0):
+        """
+        Returns (pcm_bytes, new_position) for everything captured since
+        `position`, waiting up to `timeout` seconds for new audio.
+        """
+        with self._cond:
+            if self.ring.written <= position and timeout:
+                self._cond.wait(timeout)
+            oldest = self.ring.written - self.ring.capacity
+            if position < oldest:
+                # Читатель отстал больше, чем на размер кольца — эти сэмплы потеряны
+                self.dropped_frames += oldest - position
+                position = oldest
+            samples = self.ring.read(position)
+            return samples.tobytes(), self.ring.written
+
+    def stats(self):
+        return {"overflows": self.overflows, "dropped_frames": self.dropped_frames}
+
+
+def iter_chunks(released, p=None, rate=None, capture=None):
+    """
+    Yields 16-bit PCM chunks until the `released` event is set, either from
+    an always-open ContinuousCapture or from a stream opened just for this
+    recording.
+    """
+    if capture:
+        position = capture.mark()
+        while not released.is_set():
+            data, position = capture.read(position, timeout=0.05)
+            if data:
+                yield data
+        # Хвост, пришедший в кольцо до момента отпускания
+        data, position = capture.read(position)
+        if data:
+            yield data
+        return
+
+    chunk = rate // 50  # 20 мс — запись останавливается сразу после отпускания
+    stream = p.open(format=pyaudio.paInt16, channels=1, rate=rate, input=True, frames_per_buffer=chunk)
+    try:
+        while not released.is_set():
+            # exception_on_overflow=False предотвращает краш при переполнении буфера
+            yield stream.read(chunk, exception_on_overflow=False)
+    finally:
+        stream.stop_stream()
+        stream.close()
@@ -0,0 +1,154 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_utils import encode_audio, load_file_pcm16, pcm16_to_float32
+from vad import split_on_silence
+
+YANDEX_STT_URL = "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize"
+GROQ_MODEL = "whisper-large-v3"
+
+# Ограничения синхронного Yandex SpeechKit v1: не длиннее 30 сек и не больше 1 МБ
+YANDEX_MAX_SECONDS = 30
+YANDEX_MAX_BYTES = 1024 * 1024
+# Groq принимает файлы до 25 МБ (на бесплатном тарифе)
+GROQ_MAX_BYTES = 25 * 1024 * 1024
+# Запас, чтобы сегмент после нарезки по паузе гарантированно влез в лимит
+LIMIT_MARGIN = 0.95
+
+
+class CloudError(Exception):
+    """Error reported by a cloud recognition API."""
+
+
+def max_parallel():
+    """How many segment requests may be in flight at once (CLOUD_MAX_PARALLEL)."""
+    return max(1, int(os.getenv("CLOUD_MAX_PARALLEL", "4")))
+
+
+def yandex_stt_url():
+    # Переопределяется для тестов против локального стаба
+    return os.getenv("YANDEX_STT_URL", YANDEX_STT_URL)
+
+
+def upload_codec():
+    """Upload codec for cloud backends (UPLOAD_CODEC): opus, flac or wav."""
+    return os.getenv("UPLOAD_CODEC", "opus").strip().lower()
+
+
+def groq_max_bytes():
+    limit_mb = os.getenv("GROQ_MAX_UPLOAD_MB")
+    return int(float(limit_mb) * 1024 * 1024) if limit_mb else GROQ_MAX_BYTES
+
+
+def split_pcm(pcm, rate, max_seconds, max_bytes, overhead=0):
+    """
+    Splits 16-bit mono PCM into segments that fit both the duration and the
+    upload-size limits, cutting at the quietest point near each limit.
+    `overhead` is the per-request container size (e.g. the 44-byte WAV header).
+    """
+    seconds_by_size = (max_bytes - overhead) / (rate * 2)
+    limit = min(max_seconds, seconds_by_size) * LIMIT_MARGIN
+    if len(pcm) / (rate * 2) <= limit:
+        return [pcm]
+    audio = pcm16_to_float32(pcm)
+    return [pcm[start * 2:end * 2] for start, end in split_on_silence(audio, rate, limit)]
+
+
+def transcribe_segments(segments, transcribe_fn):
+    """Runs `transcribe_fn` over segments with bounded parallelism, joining texts in order."""
+    if len(segments) == 1:
+        return transcribe_fn(segments[0]).strip()
+    with ThreadPoolExecutor(max_workers=min(max_parallel(), len(segments))) as pool:
+        texts = list(pool.map(transcribe_fn, segments))
+    return " ".join(t.strip() for t in texts if t and t.strip())
+
+
+def yandex_recognize(pcm, rate, api_key, folder_id=None):
+    """
+    One synchronous SpeechKit v1 request for audio that already fits the
+    limits. SpeechKit v1 takes only LPCM or OggOpus, so any other codec
+    setting sends LPCM.
+    """
+    params = {
+        "lang": "ru-RU",
+        "topic": "general"
+    }
+    data, extension = pcm, "lpcm"
+    if upload_codec() == "opus":
+        data, extension, _ = encode_audio(pcm, rate, "opus")
+    if extension == "ogg":
+        # Частота записана в самом контейнере Ogg
+        params["format"] = "oggopus"
+    else:
+        # LPCM уходит без заголовка WAV, частоту сообщаем явно
+        params["format"] = "lpcm"
+        params["sampleRateHertz"] = rate
+        data = pcm
+    if folder_id:
+        params["folderId"] = folder_id
+
+    headers = {
+        "Authorization": f"Api-Key {api_key}"
+    }
+
+    import requests  # не грузим requests при старте GUI в других режимах
+
+    response = requests.post(yandex_stt_url(), headers=headers, params=params, data=data)
+    if response.status_code != 200:
+        error_msg = response.text
+        try:
+            error_msg = response.json().get("error_message", response.text)
+        except Exception:
+            pass
+        raise CloudError(f"Yandex Error: {error_msg}")
+    return response.json().get("result", "")
+
+
+def yandex_transcribe_pcm(pcm, rate, api_key, folder_id=None):
+    """Transcribes PCM of any length with Yandex, splitting it into limit-sized segments."""
+    segments = split_pcm(pcm, rate, YANDEX_MAX_SECONDS, YANDEX_MAX_BYTES)
+    return transcribe_segments(segments, lambda seg: yandex_recognize(seg, rate, api_key, folder_id))
+
+
+def groq_recognize(client, data, filename="audio.wav"):
+    """One Groq transcription request for an upload that already fits the size limit."""
+    transcription = client.audio.transcriptions.create(
+        file=(filename, data),
+        model=GROQ_MODEL,
+        temperature=0,
+        language="ru",
+        response_format="verbose_json",
+    )
+    return transcription.text
+
+
+def groq_upload(client, pcm, rate):
+    """Compresses a PCM segment with the configured codec and sends it to Groq."""
+    data, extension, _ = encode_audio(pcm, rate, upload_codec())
+    return groq_recognize(client, data, f"audio.{extension}")
+
+
+def groq_transcribe_pcm(client, pcm, rate):
+    """Transcribes PCM of any length with Groq, splitting uploads above the size limit."""
+    # Длительность Groq не ограничивает, поэтому режем только по размеру.
+    # Лимит считается по несжатому PCM — после сжатия сегмент заведомо меньше
+    segments = split_pcm(pcm, rate, float("inf"), groq_max_bytes(), overhead=44)
+    return transcribe_segments(segments, lambda seg: groq_upload(client, seg, rate))
+
+
+def groq_transcribe_file(client, file_path, rate=16000):
+    """
+    Sends an already compressed file as-is when it fits the upload limit;
+    WAV files and oversized files are decoded, compressed and split.
+    """
+    is_wav = file_path.lower().endswith(".wav")
+    if os.path.getsize(file_path) <= groq_max_bytes() and not (is_wav and upload_codec() != "wav"):
+        with open(file_path, "rb") as file:
+            return groq_recognize(client, file.read(), os.path.basename(file_path))
+
+    return groq_transcribe_pcm(client, load_file_pcm16(file_path, rate), rate)
+
+
+def yandex_transcribe_file(file_path, api_key, folder_id=None, rate=16000):
+    """Decodes a file to PCM at `rate` and transcribes it (compressed per UPLOAD_CODEC)."""
+    return yandex_transcribe_pcm(load_file_pcm16(file_path, rate), rate, api_key, folder_id)
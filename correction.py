@@ -0,0 +1,210 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import data_path
+
+YANDEX_GPT_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+CORRECTION_PROMPT = (
+    "Входной текст, который тебе подается, нужно проверить на грамматику, пунктуацию, "
+    "на орфографию, выдать текст в правильном русском литературном формате. "
+    "Если это числовые или размерные параметры, то мы пишем числа 1, 2, 3 и т.п."
+)
+# Короче этого (в словах) текст не отправляется в LLM — исправлять почти нечего
+MIN_WORDS = 3
+
+# Числительные словами: их модель должна переписать цифрами, такой текст не пропускаем
+_NUMBER_WORDS = re.compile(
+    r"\b(ноль|один|одна|одно|два|две|три|четыре|пять|шесть|семь|восемь|девять|десять|"
+    r"\w+надцать|двадцать|тридцать|сорок|пятьдесят|шестьдесят|семьдесят|восемьдесят|"
+    r"девяносто|сто|двести|триста|четыреста|\w+сот|тысяч\w*|миллион\w*|полтора|полторы)\b",
+    re.IGNORECASE,
+)
+_SENTENCE_START = re.compile(r"(?:^|[.!?…]\s+)(\w)")
+
+
+def normalize(text):
+    """Cache key for a transcript: case and whitespace differences don't matter."""
+    return " ".join(text.split()).lower()
+
+
+def skip_reason(text):
+    """
+    Why the LLM call can be skipped ("short" or "well_formed"), or None.
+    Well-formed means every sentence starts with a capital letter, the text
+    ends with sentence punctuation and has no numbers spelled out in words.
+    """
+    if len(text.split()) < MIN_WORDS:
+        return "short"
+    if not text.rstrip().endswith((".", "!", "?", "…")):
+        return None
+    if any(letter.islower() for letter in _SENTENCE_START.findall(text)):
+        return None
+    if _NUMBER_WORDS.search(text):
+        return None
+    return "well_formed"
+
+
+def yandex_gpt_request(text, api_key, folder_id):
+    """One YandexGPT completion; returns the corrected text or None."""
+    import requests
+
+    headers = {
+        "Authorization": f"Api-Key {api_key}",
+        "x-folder-id": folder_id,
+        "Content-Type": "application/json"
+    }
+    data = {
+        "modelUri": f"gpt://{folder_id}/yandexgpt-lite/latest",
+        "completionOptions": {
+            "stream": False,
+            "temperature": 0.3,  # Low temperature for more deterministic correction
+            # Исправленный текст не длиннее исходного: символов заведомо больше, чем токенов
+            "maxTokens": min(2000, max(100, len(text)))
+        },
+        "messages": [
+            {"role": "system", "text": CORRECTION_PROMPT},
+            {"role": "user", "text": text}
+        ]
+    }
+
+    response = requests.post(YANDEX_GPT_URL, headers=headers, json=data)
+    if response.status_code != 200:
+        print(f"YandexGPT Error ({response.status_code}): {response.text}")
+        return None
+    alternatives = response.json().get("result", {}).get("alternatives", [])
+    if alternatives:
+        corrected = alternatives[0].get("message", {}).get("text", "").strip()
+        return corrected or None
+    return None
+
+
+class CorrectionCache:
+    """
+    LRU of corrections keyed by normalized input, backed by a JSON file so
+    repeated phrases stay free across restarts. The file keeps the
+    `disk_entries` most recently used corrections.
+    """
+
+    def __init__(self, path=None, memory_entries=512, disk_entries=5000):
+        self.path = path or os.getenv("CORRECTION_CACHE_FILE") or data_path("correction_cache.json")
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = OrderedDict()
+        self._disk = None
+        self._lock = threading.Lock()
+
+    def _load_disk(self):
+        if self._disk is None:
+            self._disk = OrderedDict()
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._disk.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+        return self._disk
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            value = self._load_disk().get(key)
+            if value is not None:
+                self._remember(key, value)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+            disk = self._load_disk()
+            disk[key] = value
+            disk.move_to_end(key)
+            while len(disk) > self.disk_entries:
+                disk.popitem(last=False)
+            self._save(disk)
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _save(self, disk):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(disk, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Correction cache write error: {e}")
+
+
+class Corrector:
+    """
+    YandexGPT post-correction with a cache and skip heuristics. Time saved
+    is estimated from the average latency of the LLM calls actually made.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or CorrectionCache()
+        self.requests = 0
+        self.outcomes = {"llm": 0, "hit": 0, "short": 0, "well_formed": 0, "error": 0}
+        self.llm_seconds = 0.0
+
+    def correct(self, text, api_key, folder_id):
+        """Returns (text, outcome); outcome is llm, hit, short, well_formed or error."""
+        self.requests += 1
+        key = normalize(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return self._done(cached, "hit")
+        reason = skip_reason(text)
+        if reason:
+            return self._done(text, reason)
+
+        started = time.perf_counter()
+        try:
+            corrected = yandex_gpt_request(text, api_key, folder_id)
+        except Exception as e:
+            print(f"YandexGPT Exception: {e}")
+            corrected = None
+        self.llm_seconds += time.perf_counter() - started
+        if not corrected:
+            return self._done(text, "error")
+        self.cache.put(key, corrected)
+        print(f"YandexGPT Correction: '{text}' -> '{corrected}'")
+        return self._done(corrected, "llm")
+
+    def _done(self, text, outcome):
+        self.outcomes[outcome] += 1
+        return text, outcome
+
+    def saved_seconds(self):
+        calls = self.outcomes["llm"] + self.outcomes["error"]
+        if not calls:
+            return 0.0
+        avoided = self.outcomes["hit"] + self.outcomes["short"] + self.outcomes["well_formed"]
+        return avoided * self.llm_seconds / calls
+
+    def summary(self):
+        hits = self.outcomes["hit"]
+        skipped = self.outcomes["short"] + self.outcomes["well_formed"]
+        return (f"{self.requests} correction(s): {hits} cache hit(s) ({hits / max(1, self.requests):.0%}), "
+                f"{skipped} skipped, {self.outcomes['llm']} LLM call(s), "
+                f"~{self.saved_seconds():.1f}s saved")
+
+
+_corrector = None
+
+
+def get_corrector():
+    """Process-wide corrector shared by dictation and file transcription."""
+    global _corrector
+    if _corrector is None:
+        _corrector = Corrector()
+    return _corrector
@@ -1,17 +1,23 @@
-import whisper
 import keyboard
 import pyaudio
-import wave
 import os
-import pyperclip
 import time
-import tempfile
 import threading
 import ctypes
 import msvcrt
 import gc
+import queue
 from datetime import datetime
 from overlay import RecordingOverlay
+from audio_utils import (WHISPER_SAMPLE_RATE, negotiate_capture_rate, pcm16_to_whisper,
+                         resample_pcm16)
+from capture import ContinuousCapture, iter_chunks
+from cloud_backends import groq_transcribe_pcm
+from calibration import Calibration, latency_budget_ms
+from model_registry import local_engine, preload_model, start_idle_unloader
+from streaming import StreamingTranscriber
+from text_delivery import make_sink
+from vad import Endpointer, format_trim_stats, trim_pcm16
 from groq import Groq
 from dotenv import load_dotenv
 
@@ -41,74 +47,177 @@ HOTKEY = 'F8'          # Клавиша, которую нужно удержи
 MODEL_SIZE = "small"   # Модель (tiny, base, small, medium, large)
 LANGUAGE = "ru"        # Язык распознавания
 GROQ_API_KEY = os.getenv("GROQ_API_KEY") # API ключ для Groq (если есть)
+STREAMING = os.getenv("STREAMING_MODE", "0") == "1"  # Распознавать окнами прямо во время записи (только локальная модель)
+INITIAL_PROMPT = "Привет, это проба пера. Пишем текст на русском языке."
+CONTINUOUS_CAPTURE = os.getenv("CAPTURE_MODE", "on_demand") == "continuous"  # Держать микрофон открытым
+PREROLL_MS = int(os.getenv("PREROLL_MS", "300"))  # Сколько звука до нажатия добавлять к записи
+TARGET_RATE = WHISPER_SAMPLE_RATE  # Whisper (и локальный, и Groq) работает на 16 кГц
+SEGMENT_SECONDS = float(os.getenv("DICTATION_SEGMENT_SECONDS", "20"))  # Длина сегмента длинной диктовки
+SEGMENT_PAUSE_MS = 400  # Пауза, по которой закрывается набравший длину сегмент
+SEGMENT_MIN_SPEECH_MS = 90  # Сколько речи нужно сегменту (как у trim_silence): короткие «да» и «нет» не теряются
+MAX_PENDING_SEGMENTS = 4  # Сегментов в очереди на распознавание
+text_sink = make_sink()  # Доставка текста в активное окно (PASTE_MODE)
 # -----------------
 
-def record_audio(filename, p, overlay):
-    chunk = 1024
-    format = pyaudio.paInt16
-    channels = 1
-    rate = 44100
+def record_audio(p, overlay, rate, released, on_chunk=None, capture=None):
+    """
+    Пишет звук с частотой rate до события отпускания HOTKEY (released) и
+    возвращает сырые 16-битные PCM-байты на TARGET_RATE (None — если ничего
+    не записано). В потоковом режиме куски уходят в on_chunk, а возвращается
+    пустой буфер. С capture звук берётся из постоянно открытого потока
+    вместе с предзаписью.
+    """
     # p = pyaudio.PyAudio() # Теперь передается извне
-    stream = None
     frames = []
+    captured = 0
+    chunks = iter_chunks(released, p, rate, capture=capture)
     
     try:
-        try:
-            stream = p.open(format=format, channels=channels, rate=rate, input=True, frames_per_buffer=chunk)
-        except Exception as e:
-            log(f"Ошибка открытия микрофона: {e}")
-            return False
-
         log(f"Запись идет... (Отпустите {HOTKEY} для остановки)")
         overlay.set_status("Запись...", "red")
         overlay.show()
         
         start_time = time.time()
-        max_duration = 60  # Максимальная длительность записи в секундах
+        max_duration = 60  # Предел записи целиком в память; с on_chunk длина не ограничена
         
         # Записываем пока клавиша нажата
-        while keyboard.is_pressed(HOTKEY):
-            if time.time() - start_time > max_duration:
+        for data in chunks:
+            if on_chunk is None and time.time() - start_time > max_duration:
                 log("Превышено максимальное время записи (60 сек). Остановка.")
                 break
-                
-            try:
-                # exception_on_overflow=False предотвращает краш при переполнении буфера
-                data = stream.read(chunk, exception_on_overflow=False)
+            captured += 1
+            if on_chunk:
+                on_chunk(data)
+            else:
                 frames.append(data)
-            except IOError as e:
-                log(f"Ошибка чтения аудиопотока: {e}")
-                break
 
         log("Запись завершена.")
         
+    except IOError as e:
+        # Сюда же попадает ошибка открытия микрофона
+        log(f"Ошибка аудиопотока: {e}")
     except Exception as e:
         log(f"Критическая ошибка при записи: {e}")
-        return False
+        return None
     finally:
         # Убираем overlay.hide() отсюда, чтобы он продолжал гореть во время распознавания
-        if stream:
-            stream.stop_stream()
-            stream.close()
+        chunks.close()
         # p.terminate() # Не закрываем здесь, так как объект общий
 
+    if capture:
+        stats = capture.stats()
+        if stats["overflows"] or stats["dropped_frames"]:
+            log(f"Потери звука: переполнений {stats['overflows']}, потеряно сэмплов {stats['dropped_frames']}")
+
     # Если ничего не записали, выходим
-    if not frames:
-        return False
+    if not captured:
+        return None
+
+    # Аудио остаётся в памяти: без временного WAV и без запуска ffmpeg.
+    # Если микрофон не умеет 16 кГц, пересэмплируем здесь же
+    return resample_pcm16(b''.join(frames), rate, TARGET_RATE)
+
+def segmented_cycle(transcribe_fn, p, overlay, rate, released, capture=None):
+    """
+    Запись с нарезкой на сегменты по паузам: как только сегмент набрал
+    SEGMENT_SECONDS, первая пауза его закрывает, и он распознаётся
+    transcribe_fn(pcm) в отдельном потоке, пока клавиша ещё нажата. В памяти
+    только текущий сегмент и короткая очередь, поэтому длина записи не
+    ограничена. Возвращает (текст сегментов по порядку, было ли что записано).
+    """
+    segmenter = Endpointer(rate, hang_ms=SEGMENT_PAUSE_MS, min_speech_ms=SEGMENT_MIN_SPEECH_MS,
+                           min_segment_seconds=SEGMENT_SECONDS,
+                           max_segment_seconds=SEGMENT_SECONDS + 10)
+    # При отставании распознавания запись ждёт очередь, а не копит звук
+    segments = queue.Queue(maxsize=MAX_PENDING_SEGMENTS)
+    texts = []
+
+    def consume():
+        while True:
+            pcm = segments.get()
+            if pcm is None:
+                break
+            try:
+                # Срезаем тишину по краям и длинные паузы; сегмент без речи не отправляем
+                pcm, trim_stats = trim_pcm16(resample_pcm16(pcm, rate, TARGET_RATE), TARGET_RATE)
+                if not pcm:
+                    continue
+                log(f"Сегмент {len(texts) + 1}: {format_trim_stats(trim_stats)}")
+                texts.append(transcribe_fn(pcm))
+            except Exception as e:
+                # Поток должен дочитать очередь, иначе запись встанет на put
+                log(f"Ошибка при распознавании: {e}")
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+
+    def on_chunk(data):
+        for segment in segmenter.feed(data):
+            segments.put(segment)
+
+    recorded = False
+    try:
+        recorded = record_audio(p, overlay, rate, released, on_chunk=on_chunk, capture=capture) is not None
+        tail = segmenter.flush()
+        if tail:
+            segments.put(tail)
+    finally:
+        segments.put(None)
+    if recorded:
+        overlay.set_status("Распознавание...", "yellow")
+        log("Распознавание...")
+    consumer.join()
+    return " ".join(text for text in texts if text), recorded
 
-    # Сохраняем в файл
+def streaming_cycle(model, p, overlay, capture_rate, released, capture=None):
+    """Запись с распознаванием перекрывающимися окнами прямо во время удержания клавиши."""
+    def transcribe_window(audio, prompt):
+        return model.transcribe(audio, language=LANGUAGE, fp16=False, initial_prompt=prompt)["text"]
+
+    streamer = StreamingTranscriber(transcribe_window, input_rate=capture_rate,
+                                    initial_prompt=INITIAL_PROMPT)
+    streamer.start()
+
+    recorded = record_audio(p, overlay, capture_rate, released, on_chunk=streamer.feed, capture=capture) is not None
+    if recorded:
+        overlay.set_status("Распознавание...", "yellow")
+        log(f"Дораспознавание хвоста ({streamer.duration:.1f} сек записано)...")
+
+    text = ""
     try:
-        wf = wave.open(filename, 'wb')
-        wf.setnchannels(channels)
-        wf.setsampwidth(p.get_sample_size(format))
-        wf.setframerate(rate)
-        wf.writeframes(b''.join(frames))
-        wf.close()
+        text = streamer.finish()
     except Exception as e:
-        log(f"Ошибка сохранения файла: {e}")
-        return False
-        
-    return True
+        log(f"Ошибка при распознавании: {e}")
+
+    if recorded and streamer.duration > 0.02 and text:
+        log(f"Распознано: {text}")
+        paste_text(text)
+    elif recorded:
+        log("Речь не распознана или пустой результат.")
+
+    gc.collect()
+    overlay.hide()
+
+def reload_model(model, overlay, reloading):
+    """
+    Дожидается загрузки модели, выгруженной по простою (загрузка начинается
+    при нажатии клавиши и выставляет reloading), и показывает в оверлее,
+    сколько она заняла.
+    """
+    if not reloading.is_set():
+        return
+    reloading.clear()
+    if not model.loaded:
+        overlay.set_status("Загрузка модели...", "orange")
+    model.ensure_loaded()
+    if model.last_reload_seconds:
+        log(f"Модель загружена заново за {model.last_reload_seconds:.1f} сек")
+        overlay.set_status(f"Распознавание (загрузка {model.last_reload_seconds:.1f} с)...", "yellow")
+
+def paste_text(text):
+    # Буфер обмена (с возвратом прежнего текста) или ввод символов — см. PASTE_MODE
+    seconds = text_sink.deliver(text)
+    log(f"Текст вставлен ({text_sink.mode}) за {seconds * 1000:.0f} мс")
 
 def main():
     global GROQ_API_KEY
@@ -153,15 +262,46 @@ def main():
             return
     else:
         print("Выбран режим: Локальная модель")
+        model_map = {
+            "1": "tiny",
+            "2": "base",
+            "3": "small",
+            "4": "medium",
+            "5": "large"
+        }
+        descriptions = {
+            "tiny": "самая быстрая, наименее точная",
+            "base": "быстрая, чуть точнее",
+            "small": "сбалансированная",
+            "medium": "медленная, высокая точность",
+            "large": "очень медленная, максимальная точность",
+        }
+        
+        # Замеры калибровки (python calibration.py) на этом компьютере, если есть
+        engine = local_engine()
+        calibration = Calibration()
+        best, fits = calibration.recommend(engine=engine)
+        if calibration.synthetic and calibration.results:
+            print("Замеры калибровки сделаны на синтетических фразах и занижены — модель не рекомендуется.")
+        recommended = bool(best and fits and best["model"] in model_map.values())
+        choice = "3"
+        if recommended:
+            choice = next(number for number, name in model_map.items() if name == best["model"])
+        
         print("Выберите модель Whisper:")
-        print("1. tiny (самая быстрая, наименее точная)")
-        print("2. base (быстрая, чуть точнее)")
-        print("3. small (сбалансированная) [по умолчанию]")
-        print("4. medium (медленная, высокая точность)")
-        print("5. large (очень медленная, максимальная точность)")
+        for number, name in model_map.items():
+            line = f"{number}. {name} ({descriptions[name]}"
+            result = calibration.result(name, engine)
+            if result:
+                line += f", ~{result['latency_ms'] / 1000:.1f} с на фразу"
+            line += ")"
+            if number == choice:
+                line += " [рекомендуется]" if recommended else " [по умолчанию]"
+            print(line)
+        if recommended:
+            print(f"Рекомендация по бюджету задержки {latency_budget_ms()} мс (калибровка: python calibration.py).")
         print("Нажмите цифру 1-5 или Enter. Автовыбор через 10 секунд...")
         
-        choice = "3"
         try:
             start_time = time.time()
             while (time.time() - start_time) < 10:
@@ -178,24 +318,28 @@ def main():
         except Exception:
             pass
         
-        model_map = {
-            "1": "tiny",
-            "2": "base",
-            "3": "small",
-            "4": "medium",
-            "5": "large"
-        }
-        
         selected_model = model_map.get(choice, MODEL_SIZE)
         print(f"Загрузка модели Whisper '{selected_model}'...")
         try:
-            model = whisper.load_model(selected_model)
+            # Прогревочный прогон — первое нажатие не ждёт инициализации ядер
+            model = preload_model(selected_model)
         except Exception as e:
             print(f"Ошибка загрузки модели: {e}")
             return
+        # Простаивающая модель выгружается и загружается заново при следующем нажатии
+        start_idle_unloader(on_unload=lambda names, reason: log(
+            f"Модель {', '.join(names)} выгружена ({'нехватка памяти' if reason == 'memory' else 'простой'})"))
 
     # Инициализация PyAudio один раз
     p = pyaudio.PyAudio()
+    capture_rate = negotiate_capture_rate(p, TARGET_RATE, pyaudio.paInt16)
+    log(f"Частота записи: {capture_rate} Гц (модели нужно {TARGET_RATE} Гц)")
+
+    capture = None
+    if CONTINUOUS_CAPTURE:
+        capture = ContinuousCapture(p, capture_rate, preroll_seconds=PREROLL_MS / 1000)
+        capture.start()
+        log(f"Микрофон открыт постоянно, предзапись {PREROLL_MS} мс")
 
     disable_quick_edit()
     
@@ -211,14 +355,38 @@ def main():
         print("---------------------------------------------------------")
 
         hotkey_event = threading.Event()
+        release_event = threading.Event()
         recording_lock = threading.Lock()
+        reloading = threading.Event()
 
-        def on_hotkey():
+        # Нажатие и отпускание приходят событиями: без опроса клавиши
+        # и без пропуска коротких нажатий
+        def on_press(event):
             if recording_lock.locked():
-                return
+                return  # автоповтор удерживаемой клавиши
+            release_event.clear()
             hotkey_event.set()
+            if model is not None and not model.loaded:
+                # Выгруженная модель грузится, пока пользователь говорит
+                reloading.set()
+                threading.Thread(target=model.ensure_loaded, daemon=True).start()
+
+        def on_release(event):
+            release_event.set()
+
+        keyboard.on_press_key(HOTKEY, on_press)
+        keyboard.on_release_key(HOTKEY, on_release)
 
-        keyboard.add_hotkey(HOTKEY, on_hotkey)
+        def transcribe_segment(pcm):
+            if use_groq:
+                return groq_transcribe_pcm(groq_client, pcm, TARGET_RATE).strip()
+            if release_event.is_set():
+                # Время перезагрузки модели показывается, когда запись уже закончена
+                reload_model(model, overlay, reloading)
+            # initial_prompt помогает модели настроиться на русскую речь и пунктуацию
+            result = model.transcribe(pcm16_to_whisper(pcm, TARGET_RATE), language=LANGUAGE,
+                                      fp16=False, initial_prompt=INITIAL_PROMPT)
+            return result["text"].strip()
 
         while True:
             try:
@@ -227,77 +395,21 @@ def main():
                 hotkey_event.clear()
                 if not recording_lock.acquire(blocking=False):
                     continue
+
+                if STREAMING and not use_groq:
+                    streaming_cycle(model, p, overlay, capture_rate, release_event, capture)
+                    continue
                 
-                # Создаем временный файл
-                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-                    temp_filename = temp_audio.name
-                
-                # Запись
-                # overlay.set_color('red') # Теперь устанавливается внутри record_audio
-                if record_audio(temp_filename, p, overlay):
-                    
-                    # Проверка на слишком короткое нажатие (случайное)
-                    if os.path.getsize(temp_filename) < 2000: # ~ < 0.1 сек
-                        overlay.hide()
-                    else:
-                        overlay.set_status("Распознавание...", "yellow")
-                        log("Распознавание...")
-                        
-                        text = ""
-                        try:
-                            if use_groq:
-                                with open(temp_filename, "rb") as file:
-                                    transcription = groq_client.audio.transcriptions.create(
-                                      file=(temp_filename, file.read()),
-                                      model="whisper-large-v3",
-                                      temperature=0,
-                                      response_format="verbose_json",
-                                    )
-                                    text = transcription.text.strip()
-                            else:
-                                # initial_prompt помогает модели настроиться на русскую речь и пунктуацию
-                                result = model.transcribe(temp_filename, language=LANGUAGE, fp16=False, initial_prompt="Привет, это проба пера. Пишем текст на русском языке.")
-                                text = result["text"].strip()
-                        except Exception as e:
-                            log(f"Ошибка при распознавании: {e}")
-
-                        if text:
-                            log(f"Распознано: {text}")
-                            
-                            # Копируем в буфер и вставляем
-                            original_clipboard = pyperclip.paste() # Сохраним что было
-                            pyperclip.copy(text)
-                            
-                            # Небольшая пауза чтобы буфер успел обновиться
-                            time.sleep(0.1) 
-                            
-                            # Эмуляция Ctrl+V
-                            keyboard.send('ctrl+v')
-                            
-                        else:
-                            log("Речь не распознана или пустой результат.")
-                        
-                        # Очистка памяти
-                        if not use_groq:
-                           try:
-                               del result
-                           except:
-                               pass
-                        del text
-                        gc.collect()
-                        overlay.hide()
-                else:
-                    overlay.hide()
-
-                # Удаляем временный файл
-                try:
-                    if os.path.exists(temp_filename):
-                        os.remove(temp_filename)
-                except:
-                    pass
-
-                # Анти-дребезг, чтобы не сработало повторно сразу же
-                time.sleep(0.5)
+                # Запись: сегменты распознаются, пока клавиша ещё нажата
+                text, recorded = segmented_cycle(transcribe_segment, p, overlay, capture_rate,
+                                                 release_event, capture)
+                if text:
+                    log(f"Распознано: {text}")
+                    paste_text(text)
+                elif recorded:
+                    log("Речь не обнаружена или пустой результат.")
+                gc.collect()
+                overlay.hide()
                 
             except KeyboardInterrupt:
                 print("\nВыход из программы.")
@@ -310,9 +422,11 @@ def main():
                     recording_lock.release()
     finally:
         try:
-            keyboard.clear_all_hotkeys()
+            keyboard.unhook_all()
         except Exception:
             pass
+        if capture:
+            capture.close()
         p.terminate()
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+import queue
+import threading
+import time
+from collections import Counter
+
+
+def hedged_call(primary, secondary=None, delay=0.0, is_valid=bool, on_settled=None):
+    """
+    Races two backends. `primary` and `secondary` are (name, fn) pairs; the
+    secondary starts after `delay` seconds, or at once if the primary fails
+    earlier. Returns (name, result) of the first valid result; the loser keeps
+    running in its thread and its result is ignored. Raises the first error
+    if neither produced a valid result.
+
+    `on_settled(race)` is called once the loser has finished too (or was never
+    started) with the winner, both latencies in ms and the latency saved.
+    """
+    started = time.perf_counter()
+    results = queue.Queue()
+
+    def launch(name, fn):
+        def run():
+            try:
+                result, error = fn(), None
+            except Exception as e:
+                result, error = None, e
+            results.put((name, result, error, time.perf_counter() - started))
+        threading.Thread(target=run, daemon=True).start()
+
+    launch(*primary)
+    running = 1
+    secondary_started = secondary is None
+    outcomes = []
+    winner = None
+
+    while winner is None and running:
+        timeout = None
+        if not secondary_started:
+            timeout = max(0.0, delay - (time.perf_counter() - started))
+        try:
+            outcome = results.get(timeout=timeout)
+        except queue.Empty:
+            # Первый бэкенд не уложился в задержку — запускаем второй
+            launch(*secondary)
+            secondary_started = True
+            running += 1
+            continue
+
+        running -= 1
+        outcomes.append(outcome)
+        name, result, error, _ = outcome
+        if error is None and is_valid(result):
+            winner = outcome
+        elif not secondary_started:
+            # Первый ответил ошибкой или пустым текстом — второй без ожидания
+            launch(*secondary)
+            secondary_started = True
+            running += 1
+
+    if on_settled and winner:
+        def settle():
+            finished = outcomes + [results.get() for _ in range(running)]
+            on_settled(_race_summary(winner, finished, is_valid))
+        if running:
+            threading.Thread(target=settle, daemon=True).start()
+        else:
+            settle()
+
+    if winner:
+        return winner[0], winner[1]
+    errors = [error for _, _, error, _ in outcomes if error is not None]
+    if errors:
+        raise errors[0]
+    return None, outcomes[0][1] if outcomes else None
+
+
+def _race_summary(winner, finished, is_valid):
+    race = {"winner": winner[0], "winner_ms": round(winner[3] * 1000, 1),
+            "loser": None, "loser_ms": None, "saved_ms": None}
+    for name, result, error, elapsed in finished:
+        if name == winner[0]:
+            continue
+        race["loser"] = name
+        if error is None and is_valid(result):
+            race["loser_ms"] = round(elapsed * 1000, 1)
+            race["saved_ms"] = round((elapsed - winner[3]) * 1000, 1)
+    return race
+
+
+class HedgeStats:
+    """Win counts and latency saved over all races of a session."""
+
+    def __init__(self):
+        self.races = 0
+        self.wins = Counter()
+        self.saved_ms = []
+
+    def add(self, race):
+        self.races += 1
+        self.wins[race["winner"]] += 1
+        if race["saved_ms"] is not None:
+            self.saved_ms.append(race["saved_ms"])
+
+    def summary(self):
+        rates = ", ".join(f"{name} won {count / self.races:.0%}" for name, count in self.wins.most_common())
+        line = f"{self.races} race(s): {rates}"
+        if self.saved_ms:
+            line += f", avg saved {sum(self.saved_ms) / len(self.saved_ms):.0f} ms"
+        return line
@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+
+def data_path(filename):
+    """Path of an app data file next to .env (AppData for the exe, project root for scripts)."""
+    if getattr(sys, 'frozen', False):
+        return os.path.join(os.environ.get('APPDATA', ''), 'WisperAI', filename)
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+
+
+def default_metrics_path():
+    """METRICS_FILE, otherwise metrics.jsonl next to .env."""
+    return os.getenv("METRICS_FILE") or data_path("metrics.jsonl")
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    if sys.platform == "win32":
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def available_memory_mb():
+    """Physical memory available to new allocations in MB, None if unknown."""
+    if sys.platform == "win32":
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return None
+        return status.ullAvailPhys / (1024 * 1024)
+    try:
+        # MemAvailable учитывает кэш страниц, который ядро может отдать
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class JobTimer:
+    """
+    Collects wall-clock time per pipeline stage of one dictation or file job.
+    Repeated spans of the same stage (e.g. several uploads) are summed.
+    """
+
+    def __init__(self, kind, backend):
+        self.kind = kind
+        self.backend = backend
+        self.stages = {}
+        self.notes = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def note(self, **fields):
+        """Attaches extra fields (e.g. cache outcome) to the job record."""
+        self.notes.update(fields)
+
+    def finish(self, **extra):
+        """Returns the job record: stage times and totals in milliseconds plus `extra` fields."""
+        total = time.perf_counter() - self.started
+        job = {
+            "ts": round(time.time(), 3),
+            "kind": self.kind,
+            "backend": self.backend,
+            "stages": {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()},
+            "total_ms": round(total * 1000, 1),
+            # Для диктовки важна задержка после отпускания клавиши, а не длина записи
+            "latency_ms": round((total - self.stages.get("capture", 0.0)) * 1000, 1),
+        }
+        job.update(self.notes)
+        job.update(extra)
+        return job
+
+
+class MetricsLog:
+    """Appends job records as JSON lines to a size-rotated file."""
+
+    def __init__(self, path=None, max_bytes=None, backups=3):
+        self.path = path or default_metrics_path()
+        self.max_bytes = max_bytes or int(float(os.getenv("METRICS_MAX_MB", "5")) * 1024 * 1024)
+        self.backups = backups
+        self._logger = None
+        self._lock = threading.Lock()
+
+    def _get_logger(self):
+        if self._logger is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes,
+                                          backupCount=self.backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger(f"wisper.metrics.{self.path}")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+    def append(self, job):
+        try:
+            with self._lock:
+                self._get_logger().info(json.dumps(job, ensure_ascii=False))
+        except Exception as e:
+            # Метрики не должны ломать диктовку
+            print(f"Metrics write error: {e}")
+
+
+class RollingStats:
+    """Percentiles of the last `window` values."""
+
+    def __init__(self, window=100):
+        self.values = deque(maxlen=window)
+
+    def add(self, value):
+        self.values.append(value)
+
+    def percentile(self, q):
+        if not self.values:
+            return 0.0
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+_log = None
+
+
+def record_job(job):
+    """Appends a finished job to the process-wide metrics file."""
+    global _log
+    if _log is None:
+        _log = MetricsLog()
+    _log.append(job)
+
+
+def format_stages(job):
+    return ", ".join(f"{stage} {ms:.0f} ms" for stage, ms in job["stages"].items())
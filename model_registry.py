@@ -0,0 +1,519 @@
+import gc
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+ENGINES = ("pytorch", "ctranslate2")
+# Параметров в моделях Whisper (млн) — оценка размера ещё не загруженной модели
+MODEL_PARAMS_M = {"tiny": 39, "base": 74, "small": 244, "medium": 769, "turbo": 809, "large": 1550}
+
+
+def local_engine(engine=None):
+    """Local inference engine: openai-whisper on PyTorch or faster-whisper (LOCAL_ENGINE)."""
+    engine = (engine or os.getenv("LOCAL_ENGINE", "pytorch")).strip().lower()
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown LOCAL_ENGINE '{engine}', expected one of {', '.join(ENGINES)}")
+    return engine
+
+
+def ct2_compute_type(device="cpu"):
+    return os.getenv("CT2_COMPUTE_TYPE") or ("int8" if device == "cpu" else "int8_float16")
+
+
+def model_tag(name, engine=None):
+    """Model identifier for caches and metrics; CTranslate2 output differs from PyTorch's."""
+    engine = local_engine(engine)
+    return name if engine == "pytorch" else f"{name}+ct2-{ct2_compute_type()}"
+
+
+def _resolve_device(device, engine="pytorch"):
+    if device:
+        return device
+    if engine == "ctranslate2":
+        import ctranslate2
+        return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def estimated_size_mb(name, engine=None):
+    """Approximate resident size of `name` before it is loaded, 0 if unknown."""
+    engine = local_engine(engine)
+    params = next((count for prefix, count in MODEL_PARAMS_M.items()
+                   if name == prefix or name.startswith(f"{prefix}-")), 0)
+    if "turbo" in name:
+        params = MODEL_PARAMS_M["turbo"]
+    if engine == "pytorch":
+        bytes_per_param = 4  # веса в памяти в fp32
+    else:
+        bytes_per_param = 1 if ct2_compute_type().startswith("int8") else 2
+    return params * 1e6 * bytes_per_param / (1024 * 1024)
+
+
+def _model_size_mb(model):
+    size_mb = getattr(model, "size_mb", None)
+    if size_mb is not None:
+        return size_mb
+    try:
+        return sum(p.numel() * p.element_size() for p in model.parameters()) / (1024 * 1024)
+    except Exception:
+        return 0.0
+
+
+def mmap_weights_enabled():
+    """MMAP_WEIGHTS=1: PyTorch models load from a memory-mapped copy of the checkpoint."""
+    return os.getenv("MMAP_WEIGHTS", "0") == "1"
+
+
+def whisper_cache_dir():
+    """Where openai-whisper keeps downloaded checkpoints."""
+    cache_home = os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cache_home, "whisper")
+
+
+def mmap_weights_path(name):
+    directory = os.getenv("MMAP_WEIGHTS_DIR") or os.path.join(whisper_cache_dir(), "mmap")
+    return os.path.join(directory, f"{name}.fp32.pt")
+
+
+def convert_checkpoint(name, path):
+    """
+    Writes `name` as an fp32 state dict in torch's zip format, which torch.load
+    can memory-map. Returns the loaded model, so the first start pays only the save.
+    """
+    import torch
+    import whisper
+
+    model = whisper.load_model(name, device="cpu")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save({"source": whisper._MODELS[name], "dims": vars(model.dims),
+                "model_state_dict": model.state_dict()}, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"Converted {name} to memory-mapped weights: {path}")
+    return model
+
+
+def load_whisper_mmap(name, device):
+    """
+    Loads an openai-whisper model with its tensors memory-mapped from the
+    converted checkpoint: no unpickling or fp16->fp32 copy, the OS pages
+    weights in on first touch, and processes loading the same model share
+    the page cache. The checkpoint is converted on the first load.
+    """
+    import torch
+    import whisper
+    from whisper.model import ModelDimensions, Whisper
+
+    torch_version = tuple(int(part) for part in torch.__version__.split(".")[:2])
+    if name not in whisper._MODELS or torch_version < (2, 1):
+        # Свой чекпоинт по пути или torch < 2.1 без mmap в torch.load — обычная загрузка
+        return whisper.load_model(name, device=device)
+
+    path = mmap_weights_path(name)
+    checkpoint = None
+    if os.path.exists(path):
+        try:
+            checkpoint = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+        except Exception as e:
+            print(f"Memory-mapped weights of {name} unreadable, converting again: {e}")
+        if checkpoint is not None and checkpoint.get("source") != whisper._MODELS[name]:
+            checkpoint = None  # openai-whisper сменил веса модели
+    if checkpoint is None:
+        return convert_checkpoint(name, path).to(device)
+
+    dims = ModelDimensions(**checkpoint["dims"])
+    try:
+        # Без выделения и инициализации весов, которые всё равно заменятся
+        with torch.device("meta"):
+            model = Whisper(dims)
+    except Exception:
+        model = Whisper(dims)
+    model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+    # Непостоянные буферы не хранятся в state dict: создаём заново, как в __init__ модели
+    mask = torch.empty(dims.n_text_ctx, dims.n_text_ctx).fill_(float("-inf")).triu_(1)
+    model.decoder.register_buffer("mask", mask, persistent=False)
+    all_heads = torch.zeros(dims.n_text_layer, dims.n_text_head, dtype=torch.bool)
+    all_heads[dims.n_text_layer // 2:] = True
+    model.register_buffer("alignment_heads", all_heads.to_sparse(), persistent=False)
+    if name in whisper._ALIGNMENT_HEADS:
+        model.set_alignment_heads(whisper._ALIGNMENT_HEADS[name])
+    left_on_meta = [key for key, tensor in list(model.named_parameters()) + list(model.named_buffers())
+                    if tensor.is_meta]
+    if left_on_meta:
+        # Новая версия openai-whisper завела буфер, которого мы не знаем
+        print(f"Memory-mapped {name} left tensors uninitialized ({', '.join(left_on_meta)}), "
+              "loading normally")
+        return whisper.load_model(name, device=device)
+    return model.to(device)
+
+
+class FasterWhisperModel:
+    """
+    faster-whisper (CTranslate2) model behind the openai-whisper interface:
+    `transcribe` takes a path or float32 16 kHz array and returns a dict with
+    "text" and "segments", so callers don't care which engine is loaded.
+    """
+
+    # Параметры openai-whisper, которые есть и в faster-whisper
+    _PASSTHROUGH = ("language", "initial_prompt", "temperature", "condition_on_previous_text",
+                    "beam_size", "word_timestamps")
+
+    def __init__(self, name, device, cpu_threads=0):
+        try:
+            from faster_whisper import WhisperModel
+            from faster_whisper.utils import download_model
+        except ImportError:
+            raise RuntimeError("LOCAL_ENGINE=ctranslate2 needs the faster-whisper package "
+                               "(pip install faster-whisper)")
+        self.compute_type = ct2_compute_type(device)
+        path = download_model(name)
+        self.size_mb = os.path.getsize(os.path.join(path, "model.bin")) / (1024 * 1024)
+        self.model = WhisperModel(path, device=device, compute_type=self.compute_type,
+                                  cpu_threads=cpu_threads)
+
+    def transcribe(self, audio, **kwargs):
+        options = {key: kwargs[key] for key in self._PASSTHROUGH if key in kwargs}
+        # openai-whisper по умолчанию декодирует жадно; faster-whisper — лучом 5
+        options.setdefault("beam_size", 1)
+        segments, info = self.model.transcribe(audio, **options)
+        segments = [{"start": seg.start, "end": seg.end, "text": seg.text} for seg in segments]
+        return {
+            "text": "".join(seg["text"] for seg in segments),
+            "segments": segments,
+            "language": info.language,
+        }
+
+
+class SharedModel:
+    """
+    A registry-owned Whisper model. Decoding installs kv-cache hooks on the
+    model, so concurrent `transcribe` calls on one instance are serialized.
+    The weights can be unloaded while idle; the next `transcribe` reloads
+    them through `loader` (and then calls `on_load`), so holders of the
+    instance never notice.
+    Everything else is delegated to the wrapped model.
+    """
+
+    def __init__(self, name, device, model, engine="pytorch", loader=None, on_load=None):
+        self.name = name
+        self.device = device
+        self.engine = engine
+        self.model = model
+        self.size_mb = _model_size_mb(model)
+        self.warmed = False
+        self.last_used = time.monotonic()
+        self.last_reload_seconds = 0.0
+        self._loader = loader
+        self._on_load = on_load
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    def transcribe(self, audio, **kwargs):
+        with self._lock:
+            self._ensure_loaded()
+            try:
+                return self.model.transcribe(audio, **kwargs)
+            finally:
+                self.last_used = time.monotonic()
+
+    def ensure_loaded(self):
+        """Reloads unloaded weights; returns the seconds spent loading (0 if they were resident)."""
+        with self._lock:
+            return self._ensure_loaded()
+
+    def _ensure_loaded(self):
+        if self.model is not None:
+            return 0.0
+        started = time.perf_counter()
+        self.model = self._loader()
+        self.last_used = time.monotonic()
+        seconds = time.perf_counter() - started
+        self.last_reload_seconds = seconds
+        print(f"Model {self.name} reloaded in {seconds:.2f}s")
+        if self._on_load:
+            self._on_load()
+        return seconds
+
+    def unload(self):
+        """Drops the weights unless a decode or reload is running. Returns True if unloaded."""
+        if self._loader is None or not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self.model is None:
+                return False
+            self.model = None
+            self.warmed = False
+            return True
+        finally:
+            self._lock.release()
+
+    def idle_seconds(self):
+        return time.monotonic() - self.last_used
+
+    def busy(self):
+        """True while a decode (or reload) is running on this instance."""
+        return self._lock.locked()
+
+    def __getattr__(self, item):
+        model = self.__dict__.get("model")
+        if model is None:
+            raise AttributeError(item)
+        return getattr(model, item)
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models keyed by (name, device, engine). Each model
+    is loaded once and shared by dictation and file transcription. When the
+    total size of loaded weights exceeds `memory_budget_mb` (MODEL_MEMORY_BUDGET_MB
+    by default), least-recently-used models are unloaded but stay registered:
+    callers holding one reload it on their next `transcribe`, and `get`
+    never loads a second copy.
+    """
+
+    def __init__(self, memory_budget_mb=None):
+        self.memory_budget_mb = memory_budget_mb
+        # Потоков на модель CTranslate2 (0 — по числу ядер); пул процессов делит ядра сам
+        self.cpu_threads = 0
+        self._models = OrderedDict()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, device=None, engine=None):
+        engine = local_engine(engine)
+        key = (name, _resolve_device(device, engine), engine)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Загрузка идёт вне общего замка: другие модели доступны, а повторный
+        # запрос той же модели дождётся первой загрузки
+        with key_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key]
+
+            shared = SharedModel(name, key[1], self._load(*key), engine,
+                                 loader=lambda: self._load(*key),
+                                 on_load=lambda: self._enforce_budget(keep=key))
+
+            with self._lock:
+                self._models[key] = shared
+            self._enforce_budget(keep=key)
+            return shared
+
+    def _load(self, name, device, engine):
+        if engine == "ctranslate2":
+            print(f"Loading faster-whisper model: {name} ({device}, {ct2_compute_type(device)})")
+            return FasterWhisperModel(name, device, self.cpu_threads)
+        if mmap_weights_enabled():
+            print(f"Loading Whisper model: {name} ({device}, memory-mapped)")
+            return load_whisper_mmap(name, device)
+        import whisper
+        print(f"Loading Whisper model: {name} ({device})")
+        return whisper.load_model(name, device=device)
+
+    def budget_mb(self):
+        """Memory budget in MB, 0 means unlimited."""
+        if self.memory_budget_mb is not None:
+            return self.memory_budget_mb
+        return int(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+
+    def _enforce_budget(self, keep):
+        """
+        Unloads least-recently-used models until the loaded ones fit the budget.
+        `keep` (just loaded) and models busy decoding are skipped.
+        """
+        budget = self.budget_mb()
+        if not budget:
+            return
+        with self._lock:
+            # Порядок по фактическому использованию: держатели модели вызывают transcribe мимо get
+            models = sorted(self._models.items(), key=lambda item: item[1].last_used)
+        total = sum(m.size_mb for _, m in models if m.loaded)
+        unloaded = []
+        for key, model in models:
+            if total <= budget:
+                break
+            if key == keep or not model.loaded:
+                continue
+            if model.unload():
+                total -= model.size_mb
+                unloaded.append(model)
+                print(f"Model registry: unloaded {key[0]} ({key[1]}, {key[2]}) over budget, "
+                      f"{model.size_mb:.0f} MB")
+        if unloaded:
+            release_memory()
+
+    def preload(self, name, device=None, on_stage=None, engine=None):
+        """
+        Loads `name` and runs one warm-up decode, reporting "import", "load",
+        "warmup" and "ready" to `on_stage`. Cheap when the model is already warm.
+        """
+        report = on_stage or (lambda stage: None)
+        engine = local_engine(engine)
+        report("import")
+        if engine == "ctranslate2":
+            import faster_whisper  # noqa: F401
+        else:
+            import whisper  # noqa: F401 — на холодном старте дольше всего грузится torch
+        report("load")
+        model = self.get(name, device, engine)
+        if not model.warmed:
+            report("warmup")
+            warm_up(model)
+        report("ready")
+        return model
+
+    def evict(self, name, device=None, engine=None):
+        engine = local_engine(engine)
+        with self._lock:
+            return self._models.pop((name, _resolve_device(device, engine), engine), None) is not None
+
+    def loaded(self):
+        with self._lock:
+            return list(self._models)
+
+    def model_size_mb(self, name, engine=None):
+        """Size of `name` as measured when it was loaded here, otherwise an estimate."""
+        engine = local_engine(engine)
+        with self._lock:
+            sizes = [m.size_mb for key, m in self._models.items() if key[0] == name and key[2] == engine]
+        return max(sizes) if sizes else estimated_size_mb(name, engine)
+
+    def unload_idle(self, idle_seconds):
+        """
+        Unloads the weights of models unused for `idle_seconds`. They stay
+        registered, so the next `transcribe` reloads them. Returns the names unloaded.
+        """
+        with self._lock:
+            models = list(self._models.values())
+        unloaded = [m for m in models if m.loaded and m.idle_seconds() >= idle_seconds and m.unload()]
+        if unloaded:
+            release_memory()
+            print(f"Model registry: unloaded {', '.join(m.name for m in unloaded)} "
+                  f"({sum(m.size_mb for m in unloaded):.0f} MB)")
+        return [m.name for m in unloaded]
+
+
+def release_memory():
+    """Returns freed model memory: collects cycles and empties the CUDA cache."""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+class IdleUnloader:
+    """
+    Background policy for the registry: unloads models nobody used for
+    `idle_minutes` (MODEL_IDLE_MINUTES), or used more than a minute ago when
+    available system memory falls below `min_free_mb` (MODEL_UNLOAD_FREE_MB).
+    `on_unload(names, reason)` is called with reason "idle" or "memory".
+    """
+
+    # Под нехваткой памяти не выгружаем модель, которой только что пользовались
+    PRESSURE_MIN_IDLE_SECONDS = 60
+
+    def __init__(self, registry, idle_minutes=None, min_free_mb=None, interval=30, on_unload=None):
+        self.registry = registry
+        if idle_minutes is None:
+            idle_minutes = float(os.getenv("MODEL_IDLE_MINUTES", "30"))
+        if min_free_mb is None:
+            min_free_mb = int(os.getenv("MODEL_UNLOAD_FREE_MB", "512"))
+        self.idle_minutes = idle_minutes
+        self.min_free_mb = min_free_mb
+        self.interval = interval
+        self.on_unload = on_unload
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enabled(self):
+        return bool(self.idle_minutes or self.min_free_mb)
+
+    def check(self):
+        """One pass of the policy; returns the names unloaded."""
+        from metrics import available_memory_mb
+
+        reason, unloaded = None, []
+        if self.min_free_mb:
+            free_mb = available_memory_mb()
+            if free_mb is not None and free_mb < self.min_free_mb:
+                reason = "memory"
+                unloaded = self.registry.unload_idle(self.PRESSURE_MIN_IDLE_SECONDS)
+        if not unloaded and self.idle_minutes:
+            reason = "idle"
+            unloaded = self.registry.unload_idle(self.idle_minutes * 60)
+        if unloaded and self.on_unload:
+            self.on_unload(unloaded, reason)
+        return unloaded
+
+    def start(self):
+        if self._thread is None and self.enabled():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Idle unloader error: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+
+def warm_up(model, seconds=1.0):
+    """
+    Decodes a short synthetic clip with the dictation settings, so lazy kernel
+    selection and allocator growth happen now and not on the first real request.
+    """
+    import numpy as np
+
+    rate = 16000
+    t = np.arange(int(seconds * rate)) / rate
+    audio = (0.05 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    started = time.perf_counter()
+    model.transcribe(audio, language="ru", fp16=False, temperature=0.0,
+                     condition_on_previous_text=False)
+    model.warmed = True
+    print(f"Warm-up decode of {model.name}: {time.perf_counter() - started:.2f}s")
+
+
+registry = ModelRegistry()
+
+
+def get_model(name, device=None, engine=None):
+    """Returns the shared model instance for `name` from the process-wide registry."""
+    return registry.get(name, device, engine)
+
+
+def preload_model(name, device=None, on_stage=None, engine=None):
+    """Loads and warms up `name` in the process-wide registry."""
+    return registry.preload(name, device, on_stage, engine)
+
+
+_unloader = None
+
+
+def start_idle_unloader(on_unload=None):
+    """Starts (once per process) the idle/memory-pressure unloading of registry models."""
+    global _unloader
+    if _unloader is None:
+        _unloader = IdleUnloader(registry)
+    _unloader.on_unload = on_unload
+    return _unloader.start()
@@ -23,7 +23,7 @@ class RecordingOverlay:
         self.root.attributes("-transparentcolor", "black")  # Прозрачный фон
         
         # Размеры и позиция (левый нижний угол)
-        width = 160
+        width = 260  # с запасом под статус с временем загрузки модели
         height = 30
         screen_width = self.root.winfo_screenwidth()
         screen_height = self.root.winfo_screenheight()
@@ -0,0 +1,123 @@
+import re
+import threading
+
+from audio_utils import pcm16_to_whisper
+
+# Сколько слов максимум ищем на стыке двух окон при склейке текста
+MAX_OVERLAP_WORDS = 8
+
+
+def _normalize_word(word):
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def merge_overlap(previous, new, max_words=MAX_OVERLAP_WORDS):
+    """
+    Appends `new` to `previous`, dropping the words at the start of `new`
+    that repeat the end of `previous` (both windows heard the overlap).
+    """
+    prev_words = previous.split()
+    new_words = new.split()
+    prev_norm = [_normalize_word(w) for w in prev_words[-max_words:]]
+    new_norm = [_normalize_word(w) for w in new_words[:max_words]]
+
+    skip = 0
+    for k in range(min(len(prev_norm), len(new_norm)), 0, -1):
+        if prev_norm[-k:] == new_norm[:k]:
+            skip = k
+            break
+
+    tail = " ".join(new_words[skip:])
+    if not previous:
+        return tail
+    if not tail:
+        return previous
+    return f"{previous} {tail}"
+
+
+class StreamingTranscriber:
+    """
+    Decodes captured audio in overlapping windows while recording is still
+    in progress, so only the last partial window is left to decode after
+    the hotkey is released. Decoded audio is dropped from the buffer (all but
+    the overlap), so memory does not grow with the length of the recording.
+
+    `transcribe_fn(audio, prompt)` receives float32 audio at 16 kHz and
+    returns the recognized text for that window.
+    """
+
+    def __init__(self, transcribe_fn, input_rate, window_seconds=10.0,
+                 overlap_seconds=1.0, initial_prompt=""):
+        self.transcribe_fn = transcribe_fn
+        self.input_rate = input_rate
+        self.window_bytes = int(window_seconds * input_rate) * 2
+        self.overlap_bytes = int(overlap_seconds * input_rate) * 2
+        self.initial_prompt = initial_prompt
+
+        self.text = ""
+        self.error = None
+        self._pcm = bytearray()  # ещё не распознанный звук плюс перекрытие
+        self._committed = 0  # байт буфера, уже отданных на распознавание
+        self._fed = 0  # байт, полученных за всю запись
+        self._finished = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def duration(self):
+        """Seconds of audio fed so far."""
+        return self._fed / 2 / self.input_rate
+
+    def start(self):
+        self._thread.start()
+
+    def feed(self, data):
+        """Adds a chunk of 16-bit mono PCM captured at `input_rate`."""
+        with self._cond:
+            self._pcm.extend(data)
+            self._fed += len(data)
+            if len(self._pcm) - self._committed >= self.window_bytes:
+                self._cond.notify()
+
+    def finish(self):
+        """Stops accepting audio, decodes the remaining tail and returns the full text."""
+        with self._cond:
+            self._finished = True
+            self._cond.notify()
+        self._thread.join()
+        if self.error:
+            raise self.error
+        return self.text.strip()
+
+    def _next_window(self):
+        with self._cond:
+            while (not self._finished
+                   and len(self._pcm) - self._committed < self.window_bytes):
+                self._cond.wait()
+
+            available = len(self._pcm) - self._committed
+            if available <= 0:
+                return None
+            end = self._committed + min(available, self.window_bytes)
+            start = max(0, self._committed - self.overlap_bytes)
+            chunk = bytes(self._pcm[start:end])
+            # Распознанное больше не нужно, кроме перекрытия со следующим окном
+            drop = max(0, end - self.overlap_bytes)
+            del self._pcm[:drop]
+            self._committed = end - drop
+            return chunk
+
+    def _run(self):
+        try:
+            while True:
+                chunk = self._next_window()
+                if chunk is None:
+                    break
+                audio = pcm16_to_whisper(chunk, self.input_rate)
+                # Хвост уже распознанного текста помогает модели не терять контекст
+                prompt = (self.initial_prompt + " " + self.text[-200:]).strip()
+                window_text = self.transcribe_fn(audio, prompt).strip()
+                if window_text:
+                    self.text = merge_overlap(self.text, window_text)
+        except Exception as e:
+            self.error = e
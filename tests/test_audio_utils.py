@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+from audio_utils import LOWPASS_TAPS, _lowpass, resample
+
+
+@pytest.mark.parametrize("length", [1, 10, LOWPASS_TAPS - 1, LOWPASS_TAPS, 4800])
+def test_lowpass_keeps_length(length):
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, length).astype(np.float32)
+    assert len(_lowpass(audio, 1 / 3)) == length
+
+
+@pytest.mark.parametrize("length", [10, LOWPASS_TAPS - 1, 4800])
+def test_downsample_shorter_than_filter(length):
+    # Сигнал короче фильтра раньше удлинялся: 10 отсчётов 48 кГц давали 21 отсчёт 16 кГц
+    audio = np.ones(length, dtype=np.float32)
+    assert len(resample(audio, 48000, 16000)) == -(-length // 3)
@@ -0,0 +1,24 @@
+from calibration import Calibration
+
+
+def result(model, latency_ms):
+    return {"model": model, "engine": "pytorch", "latency_ms": latency_ms, "rtf": 0.1,
+            "peak_rss_mb": 500, "model_rss_mb": 300}
+
+
+def calibration(tmp_path, clips):
+    cal = Calibration(path=str(tmp_path / "calibration.json"))
+    cal.clips = clips
+    cal.results = {"pytorch:tiny": result("tiny", 200), "pytorch:small": result("small", 900)}
+    return cal
+
+
+def test_recommends_most_accurate_model_within_budget(tmp_path):
+    best, fits = calibration(tmp_path, ["phrase.wav"]).recommend(budget_ms=1000, memory_mb=0)
+    assert fits and best["model"] == "small"
+
+
+def test_no_recommendation_from_synthetic_clips(tmp_path):
+    # Синтетика распознаётся почти в пустой текст: по таким замерам модель не выбираем
+    cal = calibration(tmp_path, ["synthetic_3s", "synthetic_10s"])
+    assert cal.recommend(budget_ms=1000, memory_mb=0) == (None, False)
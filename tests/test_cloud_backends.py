@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+from audio_utils import float32_to_pcm16, synth_utterance
+from cloud_backends import YANDEX_MAX_BYTES, YANDEX_MAX_SECONDS, split_pcm, yandex_transcribe_pcm
+
+
+class StubSpeechKit(ThreadingHTTPServer):
+    """SpeechKit v1 stub: answers each segment with its index, later segments first."""
+
+    daemon_threads = True
+
+    def __init__(self, segments):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.segments = segments
+        self.bodies = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with server.lock:
+            server.bodies.append(body)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        index = server.segments.index(body)
+        # Первые сегменты отвечают дольше: ответы приходят не по порядку
+        time.sleep(0.05 * (len(server.segments) - index))
+        with server.lock:
+            server.in_flight -= 1
+        payload = json.dumps({"result": f"сегмент{index}"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    servers = []
+
+    def start(pcm, rate):
+        server = StubSpeechKit(split_pcm(pcm, rate, YANDEX_MAX_SECONDS, YANDEX_MAX_BYTES))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setenv("YANDEX_STT_URL", f"http://127.0.0.1:{server.server_port}/stt")
+        return server
+
+    # LPCM уходит без сжатия: тело запроса — ровно сегмент PCM
+    monkeypatch.setenv("UPLOAD_CODEC", "wav")
+    monkeypatch.setenv("CLOUD_MAX_PARALLEL", "2")
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize("rate", [16000, 48000])
+def test_segments_fit_yandex_limits(stub, rate):
+    # На 16 кГц упираемся в 30 секунд, на 48 кГц — в 1 МБ
+    pcm = float32_to_pcm16(synth_utterance(95, rate, seed=1))
+    server = stub(pcm, rate)
+    yandex_transcribe_pcm(pcm, rate, "key")
+    assert len(server.bodies) == len(server.segments) > 1
+    assert all(len(body) <= YANDEX_MAX_BYTES for body in server.bodies)
+    assert all(len(body) / (rate * 2) <= YANDEX_MAX_SECONDS for body in server.bodies)
+    assert sum(len(body) for body in server.bodies) == len(pcm)
+
+
+def test_parallel_requests_are_bounded(stub):
+    pcm = float32_to_pcm16(synth_utterance(150, 16000, seed=2))
+    server = stub(pcm, 16000)
+    yandex_transcribe_pcm(pcm, 16000, "key")
+    assert len(server.segments) > 2
+    assert server.max_in_flight == 2
+
+
+def test_texts_merged_in_capture_order(stub):
+    pcm = float32_to_pcm16(synth_utterance(150, 16000, seed=3))
+    server = stub(pcm, 16000)
+    text = yandex_transcribe_pcm(pcm, 16000, "key")
+    assert text == " ".join(f"сегмент{i}" for i in range(len(server.segments)))
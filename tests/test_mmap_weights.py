@@ -0,0 +1,33 @@
+import os
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+whisper = pytest.importorskip("whisper")
+
+from model_registry import load_whisper_mmap, mmap_weights_path, whisper_cache_dir
+
+MODEL = "tiny"
+
+
+@pytest.fixture
+def mmap_dir(tmp_path, monkeypatch):
+    if not os.path.exists(os.path.join(whisper_cache_dir(), f"{MODEL}.pt")):
+        pytest.skip(f"{MODEL}.pt is not downloaded")
+    monkeypatch.setenv("MMAP_WEIGHTS_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_converted_checkpoint_loads_and_decodes(mmap_dir):
+    audio = np.zeros(16000, dtype=np.float32)
+    # Первая загрузка конвертирует чекпоинт, вторая читает его через mmap
+    first = load_whisper_mmap(MODEL, "cpu")
+    assert os.path.exists(mmap_weights_path(MODEL))
+    second = load_whisper_mmap(MODEL, "cpu")
+
+    assert not any(t.is_meta for t in list(second.parameters()) + list(second.buffers()))
+    assert torch.equal(second.decoder.mask, first.decoder.mask)
+    for model in (first, second):
+        result = model.transcribe(audio, language="ru", fp16=False, temperature=0.0)
+        assert isinstance(result["text"], str)
@@ -0,0 +1,48 @@
+import pytest
+
+import model_registry
+from model_registry import ModelRegistry, estimated_size_mb
+
+SIZES = {"small": 1000, "medium": 1500}
+
+
+class FakeModel:
+    def __init__(self, name):
+        self.name = name
+        self.size_mb = SIZES[name]
+
+    def transcribe(self, audio, **kwargs):
+        return {"text": self.name}
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(model_registry, "_resolve_device", lambda device, engine="pytorch": "cpu")
+    registry = ModelRegistry(memory_budget_mb=1800)
+    registry.loads = []
+
+    def load(name, device, engine):
+        registry.loads.append(name)
+        return FakeModel(name)
+
+    registry._load = load
+    return registry
+
+
+def test_over_budget_model_is_unloaded_not_duplicated(registry):
+    small = registry.get("small")
+    medium = registry.get("medium")
+    assert not small.loaded and medium.loaded
+    # Держатель выгруженной модели получает тот же экземпляр, второй копии нет
+    assert registry.get("small") is small
+    assert registry.loads == ["small", "medium"]
+
+    small.transcribe(None)
+    assert small.loaded and not medium.loaded
+    assert registry.loads == ["small", "medium", "small"]
+
+
+def test_model_size_prefers_loaded_measurement(registry):
+    assert registry.model_size_mb("medium") == pytest.approx(estimated_size_mb("medium"))
+    registry.get("medium")
+    assert registry.model_size_mb("medium") == 1500
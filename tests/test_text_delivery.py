@@ -0,0 +1,122 @@
+import sys
+import types
+
+import pytest
+
+import text_delivery
+from text_delivery import ClipboardSink, FakeSink, TypingSink, make_sink
+
+
+class FakeTimer:
+    """threading.Timer that waits for the test to fire it."""
+
+    pending = []
+
+    def __init__(self, interval, function, args=()):
+        self.function = function
+        self.args = args
+
+    def start(self):
+        FakeTimer.pending.append(self)
+
+    @classmethod
+    def fire_all(cls):
+        timers, cls.pending = cls.pending, []
+        for timer in timers:
+            timer.function(*timer.args)
+
+
+@pytest.fixture
+def system(monkeypatch):
+    """Fake clipboard and keyboard: `system.clipboard` and `system.sent`."""
+    state = types.SimpleNamespace(clipboard="", sent=[], typed=[])
+
+    def copy(text):
+        state.clipboard = text
+
+    pyperclip = types.ModuleType("pyperclip")
+    pyperclip.copy = copy
+    pyperclip.paste = lambda: state.clipboard
+    keyboard = types.ModuleType("keyboard")
+    keyboard.send = lambda keys: state.sent.append((keys, state.clipboard))
+    keyboard.write = lambda text, delay=0: state.typed.append((text, delay))
+
+    monkeypatch.setitem(sys.modules, "pyperclip", pyperclip)
+    monkeypatch.setitem(sys.modules, "keyboard", keyboard)
+    monkeypatch.setattr(text_delivery.threading, "Timer", FakeTimer)
+    # Путь без счётчика буфера Windows: подтверждение чтением буфера
+    monkeypatch.setattr(text_delivery, "_clipboard_sequence", lambda: None)
+    FakeTimer.pending = []
+    return state
+
+
+def test_paste_then_restore_previous_text(system):
+    system.clipboard = "мой текст"
+    sink = ClipboardSink()
+    sink.deliver("диктовка")
+    assert system.sent == [("ctrl+v", "диктовка")]
+    FakeTimer.fire_all()
+    assert system.clipboard == "мой текст"
+
+
+def test_two_deliveries_within_restore_delay_restore_original(system):
+    system.clipboard = "мой текст"
+    sink = ClipboardSink()
+    sink.deliver("первая")
+    # Вторая вставка раньше, чем вернулся буфер: вернуть надо исходный текст, а не «первая»
+    sink.deliver("вторая")
+    assert [clip for _, clip in system.sent] == ["первая", "вторая"]
+    FakeTimer.fire_all()
+    assert system.clipboard == "мой текст"
+
+
+def test_restore_skipped_when_user_copied_something(system):
+    system.clipboard = "мой текст"
+    sink = ClipboardSink()
+    sink.deliver("диктовка")
+    system.clipboard = "скопировано пользователем"
+    FakeTimer.fire_all()
+    assert system.clipboard == "скопировано пользователем"
+
+
+def test_empty_clipboard_is_not_restored(system):
+    sink = ClipboardSink()
+    sink.deliver("диктовка")
+    assert FakeTimer.pending == []
+    assert system.clipboard == "диктовка"
+
+
+def test_restore_disabled(system):
+    system.clipboard = "мой текст"
+    ClipboardSink(restore=False).deliver("диктовка")
+    assert FakeTimer.pending == []
+
+
+def test_typing_sink_leaves_clipboard_alone(system):
+    system.clipboard = "мой текст"
+    TypingSink().deliver("привет")
+    assert system.typed == [("привет", 0)]
+    assert system.clipboard == "мой текст"
+
+
+def test_delivery_latency_is_recorded():
+    sink = FakeSink()
+    sink.deliver("a")
+    sink.deliver("b")
+    assert [text for _, text in sink.delivered] == ["a", "b"]
+    assert len(sink.latency.values) == 2
+    assert sink.summary().startswith("fake: 2 deliveries")
+
+
+def test_make_sink_modes(monkeypatch):
+    monkeypatch.setenv("PASTE_MODE", "Type")
+    assert isinstance(make_sink(), TypingSink)
+    assert isinstance(make_sink("clipboard"), ClipboardSink)
+    monkeypatch.delenv("PASTE_MODE")
+    assert isinstance(make_sink(), ClipboardSink)
+
+
+def test_make_sink_rejects_unknown_mode(monkeypatch):
+    monkeypatch.setenv("PASTE_MODE", "telepathy")
+    with pytest.raises(ValueError, match="telepathy"):
+        make_sink()
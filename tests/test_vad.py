@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from audio_utils import WHISPER_SAMPLE_RATE, float32_to_pcm16, synth_utterance
+from vad import Endpointer, trim_pcm16, trim_silence
+
+
+def tone(seconds, rate=WHISPER_SAMPLE_RATE):
+    t = np.arange(int(seconds * rate)) / rate
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+@pytest.mark.parametrize("seconds", [0.1, 0.2, 0.3, 0.39])
+def test_trim_silence_shorter_than_pad_window(seconds):
+    # Короче окна расширения маски (2 * pad + 1 кадров) — раньше падало на отрицательном хвосте
+    audio = tone(seconds)
+    trimmed, stats = trim_silence(audio, WHISPER_SAMPLE_RATE)
+    assert len(trimmed) == len(audio)
+    assert stats["trimmed_seconds"] == pytest.approx(seconds, abs=1e-3)
+
+
+def test_trim_pcm16_short_voiced_clip():
+    data = float32_to_pcm16(tone(0.3))
+    trimmed, _ = trim_pcm16(data, WHISPER_SAMPLE_RATE)
+    assert len(trimmed) == len(data)
+
+
+def test_trim_silence_silent_short_clip():
+    trimmed, _ = trim_silence(np.zeros(1600, dtype=np.float32), WHISPER_SAMPLE_RATE)
+    assert len(trimmed) == 0
+
+
+def endpoint(audio, **kwargs):
+    endpointer = Endpointer(WHISPER_SAMPLE_RATE, **kwargs)
+    pcm = float32_to_pcm16(audio)
+    segments = []
+    for i in range(0, len(pcm), 3200):
+        segments += endpointer.feed(pcm[i:i + 3200])
+    tail = endpointer.flush()
+    if tail:
+        segments.append(tail)
+    return [len(segment) / 2 / WHISPER_SAMPLE_RATE for segment in segments], endpointer
+
+
+def test_endpointer_ignores_steady_noise_above_initial_threshold():
+    # Шум RMS 0.01 выше стартового порога: раньше давал минутные «фразы» из одного шума
+    noise = np.random.default_rng(1).normal(0, 0.01, 90 * WHISPER_SAMPLE_RATE).astype(np.float32)
+    segments, endpointer = endpoint(noise)
+    assert segments == []
+    assert endpointer.noise_floor == pytest.approx(0.01, rel=0.3)
+
+
+def test_endpointer_finds_speech_in_noise():
+    rate = WHISPER_SAMPLE_RATE
+    noise = np.random.default_rng(1).normal(0, 0.01, 23 * rate).astype(np.float32)
+    noise[5 * rate:8 * rate] += synth_utterance(3, seed=2)
+    noise[18 * rate:20 * rate] += synth_utterance(2, seed=3)
+    segments, _ = endpoint(noise)
+    assert len(segments) == 2
+    assert all(seconds < 5 for seconds in segments)
+
+
+def test_segmenter_keeps_one_short_word():
+    # Настройки нарезки диктовки с удержанием: слово на 0.2 с в тишине должно дойти до распознавания
+    rate = WHISPER_SAMPLE_RATE
+    silence = np.random.default_rng(2).normal(0, 0.002, rate // 2).astype(np.float32)
+    word = synth_utterance(0.5, seed=5)[2000:5200]
+    segments, _ = endpoint(np.concatenate([silence, word, silence]), hang_ms=400,
+                           min_speech_ms=90, min_segment_seconds=20, max_segment_seconds=30)
+    assert len(segments) == 1
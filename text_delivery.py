@@ -0,0 +1,149 @@
+import os
+import sys
+import threading
+import time
+
+from metrics import RollingStats
+
+# Сколько ждать подтверждения, что буфер обмена обновился
+CLIPBOARD_TIMEOUT = 0.5
+# Через сколько вернуть прежнее содержимое: приложение читает буфер после Ctrl+V не сразу
+RESTORE_DELAY = 0.3
+
+
+class TextSink:
+    """
+    Delivers recognized text to the focused window. `deliver` measures each
+    delivery; per-mode latency percentiles are in `summary()`.
+    """
+
+    mode = "none"
+
+    def __init__(self):
+        self.latency = RollingStats(window=100)
+
+    def deliver(self, text):
+        """Sends `text`; returns the seconds it took."""
+        started = time.perf_counter()
+        self._send(text)
+        seconds = time.perf_counter() - started
+        self.latency.add(seconds * 1000)
+        return seconds
+
+    def _send(self, text):
+        raise NotImplementedError
+
+    def summary(self):
+        count = len(self.latency.values)
+        return (f"{self.mode}: {count} deliveries, p50 {self.latency.percentile(50):.0f} ms, "
+                f"p95 {self.latency.percentile(95):.0f} ms")
+
+
+def _clipboard_sequence():
+    """Windows clipboard change counter, None elsewhere."""
+    if sys.platform != "win32":
+        return None
+    import ctypes
+    return ctypes.windll.user32.GetClipboardSequenceNumber()
+
+
+class ClipboardSink(TextSink):
+    """
+    Copies the text and sends Ctrl+V. Instead of a fixed pause it waits until
+    the clipboard reports the change (sequence number on Windows, read-back
+    elsewhere), and afterwards puts the user's previous text back.
+    """
+
+    mode = "clipboard"
+
+    def __init__(self, restore=True):
+        super().__init__()
+        self.restore = restore
+        self._last = None  # (вставленный текст, что вернуть в буфер)
+
+    def _send(self, text):
+        import keyboard
+        import pyperclip
+
+        previous = self._read() if self.restore else None
+        if self._last and previous == self._last[0]:
+            # Буфер ещё не восстановлен после прошлой вставки — вернуть надо прежний
+            previous = self._last[1]
+        self._last = (text, previous)
+        sequence = _clipboard_sequence()
+        pyperclip.copy(text)
+        self._wait_for_change(text, sequence)
+        keyboard.send('ctrl+v')
+        if previous:
+            # Пустую строку не возвращаем: так pyperclip видит и картинки, их не затираем
+            threading.Timer(RESTORE_DELAY, self._restore, args=(text, previous)).start()
+
+    def _read(self):
+        import pyperclip
+        try:
+            return pyperclip.paste()
+        except Exception:
+            return None
+
+    def _wait_for_change(self, text, sequence):
+        import pyperclip
+
+        deadline = time.perf_counter() + CLIPBOARD_TIMEOUT
+        while time.perf_counter() < deadline:
+            if sequence is not None:
+                if _clipboard_sequence() != sequence:
+                    return
+            elif pyperclip.paste() == text:
+                return
+            time.sleep(0.005)
+        print("Clipboard did not confirm the update, pasting anyway")
+
+    def _restore(self, text, previous):
+        import pyperclip
+        try:
+            # Пользователь успел скопировать что-то своё — не трогаем
+            if pyperclip.paste() == text:
+                pyperclip.copy(previous)
+        except Exception as e:
+            print(f"Clipboard restore error: {e}")
+
+
+class TypingSink(TextSink):
+    """
+    Types the text as Unicode key events (SendInput with KEYEVENTF_UNICODE
+    on Windows): the clipboard is untouched and no layout is needed, but
+    long texts take longer than a paste.
+    """
+
+    mode = "type"
+
+    def _send(self, text):
+        import keyboard
+        keyboard.write(text, delay=0)
+
+
+class FakeSink(TextSink):
+    """Records deliveries as (perf_counter time, text) instead of touching the OS."""
+
+    mode = "fake"
+
+    def __init__(self, delay=0.0):
+        super().__init__()
+        self.delay = delay
+        self.delivered = []
+
+    def _send(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        self.delivered.append((time.perf_counter(), text))
+
+
+SINKS = {sink.mode: sink for sink in (ClipboardSink, TypingSink, FakeSink)}
+
+
+def make_sink(mode=None):
+    """Sink for `mode` (PASTE_MODE: clipboard, type or fake)."""
+    mode = (mode or os.getenv("PASTE_MODE", "clipboard")).strip().lower()
+    if mode not in SINKS:
+        raise ValueError(f"Unknown PASTE_MODE '{mode}', expected one of {', '.join(SINKS)}")
+    return SINKS[mode]()
@@ -1,69 +1,297 @@
-import whisper
-import sys
 import os
-from groq import Groq
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dotenv import load_dotenv
+from audio_utils import WHISPER_SAMPLE_RATE, load_file_float32
+from cloud_backends import GROQ_MODEL, groq_transcribe_file
+from model_registry import get_model, local_engine, model_tag, registry
+from transcript_cache import cached_transcribe
+from vad import split_on_silence
 
 load_dotenv()
 
-def transcribe_audio(file_path, model_name="base", use_api=False):
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".flac", ".ogg", ".opus", ".webm", ".mp4")
+# Файлы короче этого декодируются одним вызовом, длиннее — частями параллельно
+LONG_FILE_SECONDS = 120
+
+def output_path(file_path):
+    return os.path.splitext(file_path)[0] + ".txt"
+
+def is_transcribed(file_path):
+    """A file counts as done if its .txt exists and is not older than the audio."""
+    out = output_path(file_path)
+    return os.path.exists(out) and os.path.getmtime(out) >= os.path.getmtime(file_path)
+
+def cache_backend(model_name, use_api):
+    """(backend, model) part of the transcript cache key."""
+    return ("groq", GROQ_MODEL) if use_api else ("whisper", model_tag(model_name))
+
+def transcribe_file(file_path, model_name="base", use_api=False, use_cache=True):
+    """
+    Transcribes one file and returns (text, audio_seconds), from the transcript
+    cache when the same audio was already done. Raises on failure.
+    """
+    backend, model = cache_backend(model_name, use_api)
+    text, audio_seconds, _ = cached_transcribe(
+        file_path, backend, model, lambda: _transcribe_file(file_path, model_name, use_api), use_cache)
+    return text, audio_seconds
+
+def _transcribe_file(file_path, model_name, use_api):
+    if use_api:
+        api_key = os.getenv("GROQ_API_KEY")
+        if not api_key:
+            raise RuntimeError("GROQ_API_KEY not found in environment variables or .env file.")
+        from groq import Groq
+        # Файлы больше лимита загрузки режутся по паузам и уходят частями
+        return groq_transcribe_file(Groq(api_key=api_key), file_path), 0
+
+    model = get_model(model_name)
+    result = model.transcribe(file_path, fp16=False, language="ru")
+    segments = result.get("segments") or []
+    return result["text"], segments[-1]["end"] if segments else 0
+
+def _decode_chunk(model_name, audio):
+    return get_model(model_name).transcribe(audio, fp16=False, language="ru")["text"]
+
+def chunk_workers(model_name, workers):
+    """
+    Processes for parallel chunk decoding. Each holds its own copy of the
+    model outside the registry, so MODEL_MEMORY_BUDGET_MB caps their number.
+    """
+    budget = registry.budget_mb()
+    size_mb = registry.model_size_mb(model_name)
+    if not budget or not size_mb:
+        return workers
+    return max(1, min(workers, int(budget // size_mb)))
+
+def transcribe_chunked(file_path, model_name="base", workers=None, on_progress=None):
+    """
+    Transcribes a file locally, splitting long audio at silence into chunks
+    that are decoded in parallel and stitched back in order. The worker pool
+    lives for one file only, so its processes (each holding a model) exit
+    when the file is done; with one worker (or a memory budget that fits
+    one copy) the chunks are decoded in-process by the registry model.
+    `on_progress(percent, eta_seconds)` is called as chunks finish.
+    Returns (text, audio_seconds).
+    """
+    audio = load_file_float32(file_path)
+    duration = len(audio) / WHISPER_SAMPLE_RATE
+    workers = chunk_workers(model_name, workers or default_workers())
+
+    if duration <= LONG_FILE_SECONDS:
+        text = _decode_chunk(model_name, audio)
+        if on_progress:
+            on_progress(100, 0)
+        return text, duration
+
+    # Частей в пару раз больше, чем процессов: равномернее загрузка и чаще прогресс
+    chunk_seconds = min(LONG_FILE_SECONDS, max(30, duration / (workers * 2)))
+    bounds = split_on_silence(audio, WHISPER_SAMPLE_RATE, chunk_seconds)
+    texts = [""] * len(bounds)
+    started = time.time()
+    decoded_samples = 0
+
+    def report(index, text):
+        nonlocal decoded_samples
+        texts[index] = text.strip()
+        decoded_samples += bounds[index][1] - bounds[index][0]
+        if on_progress:
+            elapsed = time.time() - started
+            remaining = len(audio) - decoded_samples
+            on_progress(int(decoded_samples * 100 / len(audio)), elapsed * remaining / decoded_samples)
+
+    if workers == 1:
+        for i, (start, end) in enumerate(bounds):
+            report(i, _decode_chunk(model_name, audio[start:end]))
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker,
+                                 initargs=(model_name, False, threads)) as pool:
+            futures = {pool.submit(_decode_chunk, model_name, audio[start:end]): i
+                       for i, (start, end) in enumerate(bounds)}
+            for future in as_completed(futures):
+                report(futures[future], future.result())
+
+    return " ".join(t for t in texts if t), duration
+
+def transcribe_audio(file_path, model_name="base", use_api=False, use_cache=True):
     if not os.path.exists(file_path):
         print(f"Error: File '{file_path}' not found.")
         return
 
-    text = ""
     if use_api:
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            print("Error: GROQ_API_KEY not found in environment variables or .env file.")
-            return
-        
         print(f"Transcribing '{file_path}' via Groq API (whisper-large-v3)...")
-        try:
-            client = Groq(api_key=api_key)
-            with open(file_path, "rb") as file:
-                transcription = client.audio.transcriptions.create(
-                    file=(file_path, file.read()),
-                    model="whisper-large-v3",
-                    temperature=0,
-                    language="ru",
-                    response_format="verbose_json",
-                )
-                text = transcription.text
-        except Exception as e:
-            print(f"Error during Groq API transcription: {e}")
-            return
     else:
-        print(f"Loading model '{model_name}'...")
-        model = whisper.load_model(model_name)
-        
-        print(f"Transcribing '{file_path}' locally...")
-        result = model.transcribe(file_path, fp16=False, language="ru")
-        text = result["text"]
-    
+        print(f"Transcribing '{file_path}' locally with model '{model_name}'...")
+
+    def report(percent, eta):
+        print(f"  {percent}% done, ~{eta:.0f}s left")
+
+    try:
+        if use_api:
+            text, _ = transcribe_file(file_path, model_name, use_api, use_cache)
+        else:
+            text, _, _ = cached_transcribe(
+                file_path, "whisper", model_tag(model_name),
+                lambda: transcribe_chunked(file_path, model_name, on_progress=report), use_cache)
+    except Exception as e:
+        print(f"Error during transcription: {e}")
+        return
+
     if not text:
         print("Transcription failed or returned empty text.")
         return
 
     print("\nTranscription result:\n")
     print(text)
-    
+
     # Save to a text file
-    output_file = os.path.splitext(file_path)[0] + ".txt"
+    output_file = output_path(file_path)
     with open(output_file, "w", encoding="utf-8") as f:
         f.write(text)
     print(f"\nTranscription saved to '{output_file}'")
 
+def collect_files(pattern):
+    """Expands a directory or a glob pattern into a sorted list of audio files."""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*")
+    return sorted(
+        path for path in glob.glob(pattern, recursive=True)
+        if os.path.isfile(path) and path.lower().endswith(AUDIO_EXTENSIONS)
+    )
+
+def default_workers(use_api=False):
+    env_workers = os.getenv("BATCH_WORKERS")
+    if env_workers:
+        return max(1, int(env_workers))
+    if use_api:
+        return 4
+    # Каждый процесс держит свою модель и сам использует несколько потоков
+    return max(1, (os.cpu_count() or 1) // 4)
+
+def _init_pool_worker(model_name, use_api, threads):
+    """Runs once per pool process: loads the model so every job reuses it."""
+    load_dotenv()
+    if sys.platform == "win32":
+        # Процесс пула запущен из GUI без консоли — не даём ffmpeg открывать окна
+        import subprocess
+        _original_popen = subprocess.Popen
+
+        def _popen_no_console(*args, **kwargs):
+            kwargs.setdefault("creationflags", subprocess.CREATE_NO_WINDOW)
+            return _original_popen(*args, **kwargs)
+
+        subprocess.Popen = _popen_no_console
+    if not use_api:
+        if local_engine() == "ctranslate2":
+            registry.cpu_threads = threads
+        else:
+            import torch
+            torch.set_num_threads(threads)
+        get_model(model_name)
+
+def _transcribe_job(file_path, model_name, use_api, use_cache=True):
+    started = time.time()
+    try:
+        text, audio_seconds = transcribe_file(file_path, model_name, use_api, use_cache)
+        if text:
+            with open(output_path(file_path), "w", encoding="utf-8") as f:
+                f.write(text)
+        return {"path": file_path, "text": text, "audio_seconds": audio_seconds,
+                "seconds": time.time() - started, "error": None}
+    except Exception as e:
+        return {"path": file_path, "text": "", "audio_seconds": 0,
+                "seconds": time.time() - started, "error": str(e)}
+
+def transcribe_batch(files, model_name="base", use_api=False, workers=None, force=False,
+                     on_result=None, use_cache=True):
+    """
+    Transcribes `files` across a pool of worker processes, each holding a
+    loaded model, and writes one .txt next to every file. Files that already
+    have an up-to-date .txt are skipped unless `force` is set; files whose
+    audio is in the transcript cache are not decoded unless `use_cache` is off.
+    `on_result(result, done, total)` is called as each file finishes.
+    Returns a summary dict with aggregate throughput.
+    """
+    pending = [f for f in files if force or not is_transcribed(f)]
+    skipped = len(files) - len(pending)
+    workers = min(workers or default_workers(use_api), max(1, len(pending)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    summary = {"total": len(files), "skipped": skipped, "done": 0, "failed": 0,
+               "audio_seconds": 0.0, "wall_seconds": 0.0, "workers": workers}
+    if not pending:
+        return summary
+
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker,
+                             initargs=(model_name, use_api, threads)) as pool:
+        futures = [pool.submit(_transcribe_job, f, model_name, use_api, use_cache) for f in pending]
+        for i, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            if result["error"]:
+                summary["failed"] += 1
+            else:
+                summary["done"] += 1
+                summary["audio_seconds"] += result["audio_seconds"]
+            if on_result:
+                on_result(result, i, len(pending))
+
+    summary["wall_seconds"] = time.time() - started
+    return summary
+
+def format_summary(summary):
+    wall = summary["wall_seconds"] or 1e-9
+    line = (f"{summary['done']} done, {summary['failed']} failed, {summary['skipped']} skipped "
+            f"in {summary['wall_seconds']:.1f}s with {summary['workers']} worker(s)")
+    if summary["done"]:
+        line += (f" — {summary['done'] * 60 / wall:.1f} files/min, "
+                 f"{summary['audio_seconds'] / wall:.1f}x real time")
+    return line
+
+def run_batch(pattern, model_name="base", use_api=False, workers=None, force=False, use_cache=True):
+    files = collect_files(pattern)
+    if not files:
+        print(f"Error: no audio files match '{pattern}'.")
+        return
+
+    def report(result, done, total):
+        status = f"error: {result['error']}" if result["error"] else f"{result['seconds']:.1f}s"
+        print(f"[{done}/{total}] {result['path']} ({status})")
+
+    mode = "Groq API" if use_api else f"model '{model_name}'"
+    print(f"Transcribing {len(files)} file(s) with {mode}...")
+    summary = transcribe_batch(files, model_name, use_api, workers, force, on_result=report,
+                               use_cache=use_cache)
+    print(f"\nBatch finished: {format_summary(summary)}")
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python transcribe.py <audio_file_path> [model_name/api]")
-        print("Example (Local): python transcribe.py my_audio.mp3 small")
-        print("Example (API):   python transcribe.py my_audio.mp3 api")
+    parser = argparse.ArgumentParser(
+        description="Transcribe an audio file, or a directory / glob of files in batch mode.",
+        epilog="Examples: transcribe.py my_audio.mp3 small | transcribe.py my_audio.mp3 api | "
+               "transcribe.py \"meetings/*.m4a\" small --workers 3",
+    )
+    parser.add_argument("path", help="audio file, directory or glob pattern")
+    parser.add_argument("model", nargs="?", default="base", help="Whisper model name or 'api' for Groq")
+    parser.add_argument("--batch", action="store_true", help="treat path as a glob even without wildcards")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes in batch mode")
+    parser.add_argument("--force", action="store_true", help="re-transcribe files that already have a .txt")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="decode again even if the audio is in the transcript cache")
+    args = parser.parse_args()
+
+    use_api = args.model.lower() == "api"
+    model_name = "base" if use_api else args.model
+    is_batch = args.batch or os.path.isdir(args.path) or glob.has_magic(args.path)
+
+    use_cache = not args.no_cache
+
+    if is_batch:
+        run_batch(args.path, model_name, use_api, args.workers, args.force, use_cache)
+    elif use_api:
+        transcribe_audio(args.path, use_api=True, use_cache=use_cache)
     else:
-        file_path = sys.argv[1]
-        arg2 = sys.argv[2] if len(sys.argv) > 2 else "base"
-        
-        if arg2.lower() == "api":
-            transcribe_audio(file_path, use_api=True)
-        else:
-            transcribe_audio(file_path, model_name=arg2)
+        transcribe_audio(args.path, model_name=model_name, use_cache=use_cache)
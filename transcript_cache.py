@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import threading
+
+from metrics import data_path
+
+DEFAULT_LIMIT_MB = 200
+
+
+def content_hash(file_path, block_size=1024 * 1024):
+    """SHA-256 of the file content, so renamed or copied recordings still hit."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """
+    Disk cache of file transcripts keyed by audio content plus backend, model
+    and language. One JSON file per entry; the file's mtime is its last use,
+    and least recently used entries are deleted once the directory grows
+    beyond `max_bytes`. Safe to share between processes of the batch pool.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or os.getenv("TRANSCRIPT_CACHE_DIR") or data_path("transcript_cache")
+        limit_mb = float(os.getenv("TRANSCRIPT_CACHE_MB", DEFAULT_LIMIT_MB))
+        self.max_bytes = max_bytes if max_bytes is not None else int(limit_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+
+    def key(self, file_path, backend, model, language="ru"):
+        raw = f"{content_hash(file_path)}:{backend}:{model}:{language}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Returns the stored entry dict (with "text") or None."""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)  # отметка последнего использования для LRU
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, text, **fields):
+        if not text or not self.max_bytes:
+            return
+        entry = {"text": text, **fields}
+        path = self._path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._evict()
+        except OSError as e:
+            print(f"Transcript cache write error: {e}")
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = TranscriptCache()
+    return _cache
+
+
+def cached_transcribe(file_path, backend, model, transcribe_fn, use_cache=True):
+    """
+    Returns (text, audio_seconds, hit) from the cache, or runs `transcribe_fn()`
+    (which returns (text, audio_seconds)) and stores the result. With
+    `use_cache` off the cache is not read, but the fresh result replaces the entry.
+    """
+    cache = get_cache()
+    key = cache.key(file_path, backend, model)
+    if use_cache:
+        entry = cache.get(key)
+        if entry:
+            print(f"Transcript cache hit: {os.path.basename(file_path)} ({backend}/{model})")
+            return entry["text"], entry.get("audio_seconds", 0), True
+    text, audio_seconds = transcribe_fn()
+    cache.put(key, text, audio_seconds=audio_seconds)
+    return text, audio_seconds, False
@@ -0,0 +1,237 @@
+from collections import deque
+
+import numpy as np
+
+from audio_utils import float32_to_pcm16, pcm16_to_float32
+
+# Длина кадра для оценки энергии сигнала
+FRAME_MS = 30
+
+
+def frame_energy(audio, rate, frame_ms=FRAME_MS):
+    """RMS energy of consecutive non-overlapping frames of a float32 signal."""
+    frame_len = max(1, int(rate * frame_ms / 1000))
+    count = len(audio) // frame_len
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:count * frame_len].reshape(count, frame_len)
+    return np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+
+
+def split_on_silence(audio, rate, max_seconds, search_seconds=None, frame_ms=FRAME_MS):
+    """
+    Splits a signal into (start, end) sample ranges of at most `max_seconds`.
+    Each cut is placed at the quietest frame within the last `search_seconds`
+    before the limit, so chunks end in pauses rather than mid-word.
+    """
+    total = len(audio)
+    max_len = int(max_seconds * rate)
+    if total <= max_len:
+        return [(0, total)]
+
+    frame_len = max(1, int(rate * frame_ms / 1000))
+    search_len = int((search_seconds or min(10.0, max_seconds / 4)) * rate)
+    search_len = max(frame_len, min(search_len, max_len))
+    energy = frame_energy(audio, rate, frame_ms)
+
+    bounds = []
+    start = 0
+    while total - start > max_len:
+        limit = start + max_len
+        first = (limit - search_len) // frame_len
+        last = max(first + 1, limit // frame_len)
+        quietest = first + int(np.argmin(energy[first:last]))
+        cut = min(limit, quietest * frame_len + frame_len // 2)
+        if cut <= start:
+            cut = limit
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, total))
+    return bounds
+
+
+# Порог энергии, ниже которого кадр всегда считается тишиной (~ -44 дБFS)
+MIN_SPEECH_RMS = 0.006
+# Во сколько раз кадр речи громче шумового фона
+NOISE_FACTOR = 3.0
+# Окно, минимум энергии в котором ограничивает шумовой фон снизу (и во время речи)
+FLOOR_WINDOW_MS = 1500
+
+
+def speech_frames(energy):
+    """
+    Boolean mask of voiced frames. The threshold adapts to the noise floor
+    (10th percentile of frame energy) but never drops below MIN_SPEECH_RMS
+    and never rises above half of the loud frames' level.
+    """
+    if len(energy) == 0:
+        return np.zeros(0, dtype=bool)
+    floor, peak = np.percentile(energy, [10, 95])
+    threshold = max(MIN_SPEECH_RMS, min(floor * NOISE_FACTOR, peak * 0.5))
+    return energy > threshold
+
+
+def trim_silence(audio, rate, pad_ms=200, min_speech_ms=90, frame_ms=FRAME_MS):
+    """
+    Removes leading/trailing silence and collapses internal pauses of a
+    float32 signal: only audio within `pad_ms` of a voiced frame is kept,
+    so any pause longer than 2 * pad_ms shrinks to that length.
+    Returns (trimmed_audio, stats); trimmed_audio is empty when the signal
+    holds less than `min_speech_ms` of speech.
+    """
+    frame_len = max(1, int(rate * frame_ms / 1000))
+    energy = frame_energy(audio, rate, frame_ms)
+    voiced = speech_frames(energy)
+    stats = {"original_seconds": len(audio) / rate, "trimmed_seconds": 0.0}
+
+    if voiced.sum() * frame_ms < min_speech_ms:
+        return audio[:0], stats
+
+    # Расширяем маску речи на pad кадров в обе стороны (свёрткой, без циклов)
+    pad = max(0, pad_ms // frame_ms)
+    # mode="same" отдаёт max(len(voiced), 2 * pad + 1) значений — лишние у коротких записей отрезаем
+    keep = np.convolve(voiced, np.ones(2 * pad + 1), mode="same")[:len(voiced)] > 0
+
+    # Неполный последний кадр наследует решение предыдущего
+    mask = np.repeat(keep, frame_len)
+    tail = max(0, len(audio) - len(mask))
+    if tail:
+        mask = np.concatenate((mask, np.full(tail, keep[-1])))
+
+    trimmed = audio[mask]
+    stats["trimmed_seconds"] = len(trimmed) / rate
+    return trimmed, stats
+
+
+def trim_pcm16(data, rate, **kwargs):
+    """trim_silence for raw 16-bit PCM bytes; returns (pcm_bytes, stats)."""
+    trimmed, stats = trim_silence(pcm16_to_float32(data), rate, **kwargs)
+    return float32_to_pcm16(trimmed), stats
+
+
+def format_trim_stats(stats):
+    original = stats["original_seconds"]
+    saved = 1 - stats["trimmed_seconds"] / original if original else 0
+    return f"{original:.1f}s -> {stats['trimmed_seconds']:.1f}s ({saved:.0%} silence removed)"
+
+
+class Endpointer:
+    """
+    Streaming voice-activity endpointer for hands-free dictation. Audio is
+    fed in arbitrary chunks; each utterance is returned as 16-bit PCM once
+    `hang_ms` of silence follows it. The noise floor is tracked with an
+    exponential average while nobody speaks, and a frame counts as speech
+    when it is `sensitivity` times louder than that floor. Cost is one RMS
+    per 30 ms frame, so it can run all day on one core. Because the average
+    only moves in silence, the floor is also raised to the quietest frame of
+    the last FLOOR_WINDOW_MS: steady noise louder than the initial threshold
+    cannot hold the endpointer in "speech", and a segment is kept only if
+    enough of it is voiced against the threshold at its end.
+
+    With `min_segment_seconds` pauses end a segment only once it is that
+    long, so long dictation is cut into few large segments at natural
+    pauses; `max_segment_seconds` bounds the buffered audio either way.
+    """
+
+    def __init__(self, rate, hang_ms=800, sensitivity=NOISE_FACTOR, min_speech_ms=250,
+                 preroll_ms=300, max_segment_seconds=60, frame_ms=FRAME_MS, min_segment_seconds=0):
+        self.rate = rate
+        self.sensitivity = sensitivity
+        self.frame_ms = frame_ms
+        self.frame_bytes = max(1, int(rate * frame_ms / 1000)) * 2
+        self.hang_frames = max(1, hang_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.preroll_frames = preroll_ms // frame_ms
+        self.max_frames = int(max_segment_seconds * 1000 / frame_ms)
+        self.min_frames = int(min_segment_seconds * 1000 / frame_ms)
+        self.onset_frames = 2  # два громких кадра подряд — начало речи
+        self.floor_window = deque(maxlen=max(1, FLOOR_WINDOW_MS // frame_ms))
+
+        self.noise_floor = MIN_SPEECH_RMS / sensitivity
+        self._pending = b""
+        self._recent = []  # последние кадры тишины для предзаписи
+        self._segment = []
+        self._levels = []  # энергия кадров сегмента
+        self._in_speech = False
+        self._loud_run = 0
+        self._silence_run = 0
+        self._voiced = 0
+
+    @property
+    def in_speech(self):
+        return self._in_speech
+
+    def threshold(self):
+        return max(MIN_SPEECH_RMS, self.noise_floor * self.sensitivity)
+
+    def feed(self, data):
+        """Consumes a PCM chunk and returns the list of utterances completed by it."""
+        data = self._pending + data
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+        if not usable:
+            return []
+
+        frames = [data[i:i + self.frame_bytes] for i in range(0, usable, self.frame_bytes)]
+        energy = frame_energy(pcm16_to_float32(data[:usable]), self.rate, self.frame_ms)
+        segments = []
+        for frame, level in zip(frames, energy):
+            segment = self._step(frame, level)
+            if segment:
+                segments.append(segment)
+        return segments
+
+    def flush(self):
+        """Returns the utterance in progress (if it has enough speech) and resets."""
+        segment = self._finish() if self._in_speech else None
+        self._pending = b""
+        return segment
+
+    def _step(self, frame, level):
+        self.floor_window.append(level)
+        if len(self.floor_window) == self.floor_window.maxlen:
+            # В окне был хотя бы один такой тихий кадр — фон не может быть ниже
+            self.noise_floor = max(self.noise_floor, min(self.floor_window))
+        loud = level > self.threshold()
+        if not self._in_speech:
+            self._recent.append(frame)
+            if len(self._recent) > self.preroll_frames + self.onset_frames:
+                self._recent.pop(0)
+            if loud:
+                self._loud_run += 1
+                if self._loud_run >= self.onset_frames:
+                    self._in_speech = True
+                    self._segment = self._recent
+                    self._levels = [level] * len(self._segment)
+                    self._recent = []
+                    self._voiced = self._loud_run
+                    self._silence_run = 0
+            else:
+                self._loud_run = 0
+                self.noise_floor = 0.95 * self.noise_floor + 0.05 * level
+            return None
+
+        self._segment.append(frame)
+        self._levels.append(level)
+        if loud:
+            self._voiced += 1
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+        paused = self._silence_run >= self.hang_frames and len(self._segment) >= self.min_frames
+        if paused or len(self._segment) >= self.max_frames:
+            return self._finish()
+        return None
+
+    def _finish(self):
+        # Фон мог подняться за время сегмента: речь пересчитываем по итоговому порогу
+        threshold = self.threshold()
+        voiced = min(self._voiced, sum(1 for level in self._levels if level > threshold))
+        segment = b"".join(self._segment) if voiced >= self.min_speech_frames else None
+        self._segment = []
+        self._levels = []
+        self._in_speech = False
+        self._loud_run = 0
+        self._silence_run = 0
+        self._voiced = 0
+        return segment